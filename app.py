@@ -1,14 +1,72 @@
+import time
+STARTED_AT = time.perf_counter()
+
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import os
 from database import init_db, get_db
+from indexes import ensure_indexes
+from current_user import get_current_user
+from clearance import rebuild_clearance_command
+from rollover import term_command
+from certificates import prune_certificates_command
+from startup_timing import init_startup_timing
+from query_timing import init_query_timing
+from json_provider import init_json
+from compression import init_compression
+from passwords import check_method
 from bson import ObjectId
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 's8d7f6s8d7f6s8d7f6s8d7f6!@#%GHSDFhwefhwe'
 app.config['MONGODB_URI'] = os.environ.get("MONGODB_URI")
-# Initialize MongoDB
+# Indexes are not created on connect: run `flask indexes` at deploy time
+app.config['MONGO_TLS'] = os.environ.get("MONGO_TLS", "1") == "1"
+app.config['MONGO_MAX_POOL_SIZE'] = int(os.environ.get("MONGO_MAX_POOL_SIZE", 10 if os.environ.get("VERCEL") else 100))
+app.config['MONGO_MIN_POOL_SIZE'] = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+app.config['MONGO_MAX_IDLE_TIME_MS'] = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", 60000))
+app.config['MONGO_SERVER_SELECTION_TIMEOUT_MS'] = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000))
+app.config['USER_CACHE_SIZE'] = int(os.environ.get("USER_CACHE_SIZE", 2048))
+app.config['USER_CACHE_TTL'] = int(os.environ.get("USER_CACHE_TTL", 60))
+app.config['REFERENCE_CACHE_SIZE'] = int(os.environ.get("REFERENCE_CACHE_SIZE", 64))
+app.config['REFERENCE_CACHE_TTL'] = int(os.environ.get("REFERENCE_CACHE_TTL", 300))
+app.config['VERSION_CACHE_SIZE'] = int(os.environ.get("VERSION_CACHE_SIZE", 4096))
+app.config['VERSION_CACHE_TTL'] = float(os.environ.get("VERSION_CACHE_TTL", 1))
+app.config['TERM_CACHE_TTL'] = float(os.environ.get("TERM_CACHE_TTL", 30))
+# Live dashboard updates; only worth it where open streams are cheap (gevent, ASGI), see events.py
+app.config['EVENTS_PUSH'] = os.environ.get("EVENTS_PUSH", "0") == "1"
+app.config['EVENTS_CHANGE_STREAMS'] = os.environ.get("EVENTS_CHANGE_STREAMS", "1") == "1"
+# Streams hold a worker thread each; see events.py before raising these on sync workers
+app.config['EVENTS_STREAM_TIMEOUT'] = int(os.environ.get("EVENTS_STREAM_TIMEOUT", 60))
+app.config['EVENTS_MAX_STREAMS'] = int(os.environ.get("EVENTS_MAX_STREAMS", 8))
+app.config['EVENTS_QUEUE_SIZE'] = int(os.environ.get("EVENTS_QUEUE_SIZE", 100))
+# Method strings carry the work factor; stored hashes made with another method are upgraded at login
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+app.config['PASSWORD_HASH_WORKERS'] = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+app.config['PASSWORD_HASH_QUEUE'] = int(os.environ.get("PASSWORD_HASH_QUEUE", 32))
+app.config['PASSWORD_HASH_TIMEOUT'] = float(os.environ.get("PASSWORD_HASH_TIMEOUT", 10))
+# Refuse to start with a weak work factor
+check_method(app.config['PASSWORD_HASH_METHOD'])
+# Serverless functions are frozen once they respond, so work is not left on background threads there
+app.config['BACKGROUND_JOBS'] = os.environ.get("BACKGROUND_JOBS", "0" if os.environ.get("VERCEL") else "1") == "1"
+# Largest roster imported within the request when BACKGROUND_JOBS is off
+app.config['ROSTER_INLINE_ROWS'] = int(os.environ.get("ROSTER_INLINE_ROWS", 100))
+app.config['CERTIFICATE_DIR'] = os.environ.get("CERTIFICATE_DIR")
+# Keep files at least as long as certificate_jobs documents live (a day)
+app.config['CERTIFICATE_FILE_TTL'] = int(os.environ.get("CERTIFICATE_FILE_TTL", 86400))
+# Largest batch rendered within the request when there is no pool or no BACKGROUND_JOBS
+app.config['CERTIFICATE_INLINE_LIMIT'] = int(os.environ.get("CERTIFICATE_INLINE_LIMIT", 500))
+app.config['CERTIFICATE_WORKERS'] = int(os.environ.get("CERTIFICATE_WORKERS", 0 if os.environ.get("VERCEL") else min(4, os.cpu_count() or 1)))
+app.config['JSON_PROVIDER'] = os.environ.get("JSON_PROVIDER", "orjson")
+app.config['COMPRESSION'] = os.environ.get("COMPRESSION", "1") == "1"
+app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get("COMPRESS_MIN_SIZE", 1024))
+app.config['COMPRESS_GZIP_LEVEL'] = int(os.environ.get("COMPRESS_GZIP_LEVEL", 6))
+app.config['COMPRESS_BROTLI_QUALITY'] = int(os.environ.get("COMPRESS_BROTLI_QUALITY", 4))
+app.config['QUERY_TIMING'] = os.environ.get("QUERY_TIMING", "1") == "1"
+app.config['QUERY_N_PLUS_ONE_THRESHOLD'] = int(os.environ.get("QUERY_N_PLUS_ONE_THRESHOLD", 10))
+app.config['QUERY_SLOW_MS'] = float(os.environ.get("QUERY_SLOW_MS", 500))
+# Register MongoDB; the client is created on first use in each process
 init_db(app)
 
 # Import blueprints
@@ -23,20 +81,27 @@ app.register_blueprint(student_bp, url_prefix='/student')
 app.register_blueprint(staff_bp, url_prefix='/staff')
 app.register_blueprint(hod_bp, url_prefix='/hod')
 
+app.cli.add_command(rebuild_clearance_command)
+app.cli.add_command(term_command)
+app.cli.add_command(prune_certificates_command)
+init_startup_timing(app, STARTED_AT)
+init_query_timing(app)
+init_json(app)
+init_compression(app)
+
 @app.route('/')
 def index():
     if 'user_id' in session:
-        db = get_db()
-        user = db.users.find_one({'_id': ObjectId(session['user_id'])})
+        user = get_current_user()
         if user is None:
             # User not found, clear session and redirect to login
             session.pop('user_id', None)
             return redirect(url_for('login'))
-        if user['role'] == 'student':
+        if user.role == 'student':
             return redirect(url_for('student.dashboard'))
-        elif user['role'] == 'staff':
+        elif user.role == 'staff':
             return redirect(url_for('staff.dashboard'))
-        elif user['role'] == 'hod':
+        elif user.role == 'hod':
             return redirect(url_for('hod.dashboard'))
     return render_template('index.html')
 
@@ -56,7 +121,7 @@ def create_sample_data():
         hod_data = {
             'name': 'Dr. John Smith',
             'email': 'hod@college.edu',
-            'password': 'password123',
+            'password': generate_password_hash('password123', method=app.config['PASSWORD_HASH_METHOD']),
             'role': 'hod',
             'department': 'CSE',
             'class_section': 'A',
@@ -164,5 +229,9 @@ def create_sample_data():
 
 if __name__ == "__main__":
    with app.app_context():
+    errors = ensure_indexes(get_db())
+    if errors:
+        raise SystemExit('\n'.join(f'Failed to create {collection}.{name}: {message}'
+                                   for collection, name, message in errors))
     create_sample_data()
     app.run(debug=True)
@@ -0,0 +1,2 @@
+# Endpoint benchmarks with per-endpoint query budgets. Run with
+#   python -m benchmarks --help
@@ -0,0 +1,113 @@
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+# python -m benchmarks [--uri mongodb://localhost:27017/nodue_bench | --spawn]
+#
+# Builds a synthetic department in a scratch database, calls every endpoint
+# in benchmarks.endpoints through the Flask test client and fails (exit 1)
+# when one errors or issues more MongoDB commands than its budget.
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+@contextmanager
+def spawn_mongod(mongod='mongod'):
+    # Throwaway mongod on a temporary dbpath, removed afterwards
+    executable = shutil.which(mongod)
+    if executable is None:
+        sys.exit(f'{mongod} not found on PATH; pass --uri instead')
+    dbpath = tempfile.mkdtemp(prefix='nodue-bench-')
+    port = _free_port()
+    process = subprocess.Popen(
+        [executable, '--dbpath', dbpath, '--port', str(port), '--bind_ip', '127.0.0.1', '--quiet'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    uri = f'mongodb://127.0.0.1:{port}/nodue_bench'
+    try:
+        client = MongoClient(uri, serverSelectionTimeoutMS=500)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                client.admin.command('ping')
+                break
+            except PyMongoError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    sys.exit('mongod did not start')
+                time.sleep(0.2)
+        client.close()
+        yield uri
+    finally:
+        process.terminate()
+        process.wait()
+        shutil.rmtree(dbpath, ignore_errors=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Endpoint latency and query budget benchmark.')
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--uri', help='MongoDB URI with a database name; the database is dropped first')
+    target.add_argument('--spawn', action='store_true', help='start a temporary mongod for the run')
+    parser.add_argument('--mongod', default='mongod', help='mongod executable for --spawn')
+    parser.add_argument('--tls', action='store_true', help='connect with TLS (off for local servers)')
+    parser.add_argument('--repeat', type=int, default=20, help='warm requests per endpoint')
+    parser.add_argument('--classes', type=int, default=8)
+    parser.add_argument('--subjects', type=int, default=6, help='subjects per semester')
+    parser.add_argument('--students', type=int, default=60, help='students per class')
+    parser.add_argument('--staff', type=int, default=12)
+    parser.add_argument('--density', type=float, default=0.7, help='share of decided statuses')
+    parser.add_argument('--only', help='run endpoints whose name contains this text')
+    args = parser.parse_args(argv)
+
+    if args.spawn:
+        with spawn_mongod(args.mongod) as uri:
+            return benchmark(uri, args)
+    return benchmark(args.uri, args)
+
+def benchmark(uri, args):
+    client = MongoClient(uri, tls=args.tls)
+    client.drop_database(client.get_database().name)
+    client.close()
+
+    # The app reads its config at import time
+    os.environ['MONGODB_URI'] = uri
+    os.environ['MONGO_TLS'] = '1' if args.tls else '0'
+    os.environ['EVENTS_CHANGE_STREAMS'] = '0'
+
+    from app import app
+    from clearance import rebuild_clearances
+    from indexes import ensure_indexes
+    from benchmarks.dataset import Scale, generate_department
+    from benchmarks.endpoints import ENDPOINTS
+    from benchmarks.runner import CommandCounter, report, run
+
+    counter = CommandCounter()
+    app.config['MONGO_EVENT_LISTENERS'] = list(app.config.get('MONGO_EVENT_LISTENERS') or []) + [counter]
+    scale = Scale(args.classes, args.subjects, args.students, args.staff, args.density)
+
+    with app.app_context():
+        db = app.extensions['mongo'].get_database()
+        errors = ensure_indexes(db)
+        if errors:
+            raise SystemExit(f'Index creation failed: {errors}')
+        started = time.perf_counter()
+        ids = generate_department(db, scale)
+        rebuild_clearances(ids['department'])
+        print(f"dataset: {scale}; {ids['students']} students, {ids['statuses']} statuses "
+              f"in {time.perf_counter() - started:.1f}s\n")
+
+    endpoints = [endpoint for endpoint in ENDPOINTS if not args.only or args.only in endpoint.name]
+    results = run(app, counter, endpoints, ids, repeat=args.repeat)
+    return 0 if report(results, sys.stdout) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+import random
+from datetime import datetime
+
+# Synthetic department for benchmarks. Every document is shaped like the ones
+# the app writes, so endpoints and indexes behave as they do in production.
+
+class Scale:
+    def __init__(self, classes=8, subjects=6, students=60, staff=12, density=0.7, seed=1):
+        self.classes = classes          # classes in the department
+        self.subjects = subjects        # subjects per semester
+        self.students = students        # students per class
+        self.staff = staff              # staff members sharing the subjects
+        self.density = density          # share of (student, subject) pairs with a decision
+        self.seed = seed
+
+    def __repr__(self):
+        return (f'{self.classes} classes x {self.students} students, {self.subjects} subjects/semester, '
+                f'{self.staff} staff, density {self.density}')
+
+def _insert(collection, docs, batch_size=1000):
+    ids = []
+    for start in range(0, len(docs), batch_size):
+        ids += collection.insert_many(docs[start:start + batch_size], ordered=False).inserted_ids
+    return [str(_id) for _id in ids]
+
+def generate_department(db, scale, department='BENCH'):
+    # Returns the ids the endpoint specs need: hod, staff, classes, subjects,
+    # students and the semester/section of the first class.
+    rnd = random.Random(scale.seed)
+    now = datetime.utcnow()
+
+    hod_id, = _insert(db.users, [{
+        'name': 'Bench HOD', 'email': f'hod@{department.lower()}.bench', 'password': 'bench',
+        'role': 'hod', 'department': department, 'class_section': None,
+        'year': None, 'semester': None, 'roll_number': None, 'created_at': now
+    }])
+    staff_ids = _insert(db.users, [{
+        'name': f'Staff {n}', 'email': f'staff{n}@{department.lower()}.bench', 'password': 'bench',
+        'role': 'staff', 'department': department, 'class_section': None,
+        'year': None, 'semester': None, 'roll_number': None, 'created_at': now
+    } for n in range(scale.staff)])
+
+    # Classes fill years 1-4 (odd semesters) and sections A, B, ... in turn
+    class_docs = []
+    for n in range(scale.classes):
+        year = n % 4 + 1
+        section = chr(ord('A') + n // 4)
+        class_docs.append({
+            'name': f'{department} Year {year} Section {section}', 'department': department,
+            'year': year, 'semester': year * 2 - 1, 'section': section,
+            'class_advisor_id': staff_ids[n % len(staff_ids)] if staff_ids else None, 'created_at': now
+        })
+    class_ids = _insert(db.classes, class_docs)
+
+    semesters = sorted({doc['semester'] for doc in class_docs})
+    subject_docs = [{
+        'name': f'Subject {semester}.{n}', 'code': f'{department}{semester}{n:02d}', 'department': department,
+        'semester': semester, 'credits': 3, 'class_id': None, 'created_at': now
+    } for semester in semesters for n in range(scale.subjects)]
+    subject_ids = _insert(db.subjects, subject_docs)
+    semester_subjects = {}
+    for subject_id, doc in zip(subject_ids, subject_docs):
+        semester_subjects.setdefault(doc['semester'], []).append(subject_id)
+
+    assignments = []
+    for class_id, cls in zip(class_ids, class_docs):
+        for n, subject_id in enumerate(semester_subjects[cls['semester']]):
+            staff_id = staff_ids[(n + class_docs.index(cls)) % len(staff_ids)]
+            assignments.append({'staff_id': staff_id, 'subject_id': subject_id, 'class_id': class_id, 'created_at': now})
+    if assignments:
+        _insert(db.staff_subjects, assignments)
+
+    student_docs = []
+    for cls in class_docs:
+        for n in range(scale.students):
+            student_docs.append({
+                'name': f"Student {cls['year']}{cls['section']}{n:03d}",
+                'email': f"s{cls['year']}{cls['section'].lower()}{n:03d}@{department.lower()}.bench",
+                'password': 'bench', 'role': 'student', 'department': department,
+                'class_section': cls['section'], 'year': cls['year'], 'semester': cls['semester'],
+                'roll_number': f"{department}{cls['year']}{cls['section']}{n:03d}", 'created_at': now
+            })
+    student_ids = _insert(db.users, student_docs)
+
+    statuses = []
+    finals = []
+    for student_id, student in zip(student_ids, student_docs):
+        approved_all = True
+        for subject_id in semester_subjects[student['semester']]:
+            if rnd.random() >= scale.density:
+                approved_all = False
+                continue
+            status = 'approved' if rnd.random() < 0.85 else 'rejected'
+            approved_all = approved_all and status == 'approved'
+            approver = rnd.randrange(len(staff_ids))
+            statuses.append({
+                'student_id': student_id, 'subject_id': subject_id, 'status': status,
+                'approved_by': staff_ids[approver], 'approved_by_name': f'Staff {approver}',
+                'remarks': rnd.choice(['', '', 'Library book due', 'Lab record']),
+                'created_at': now, 'updated_at': now
+            })
+        # The first student never asked, so requesting final approval succeeds
+        if approved_all and rnd.random() < 0.6 and student_id != student_ids[0]:
+            finals.append({
+                'student_id': student_id, 'status': rnd.choice(['pending', 'approved']),
+                'approved_by': None, 'remarks': None, 'created_at': now, 'updated_at': now
+            })
+    if statuses:
+        _insert(db.no_due_status, statuses)
+    if finals:
+        _insert(db.final_approvals, finals)
+    final_student_id = finals[0]['student_id'] if finals else student_ids[0]
+
+    first_class = class_docs[0]
+    return {
+        'department': department,
+        'hod': hod_id,
+        'staff': staff_ids[0],
+        'class_id': class_ids[0],
+        # A class of another semester, with none of subject_id's assignments
+        'other_class_id': class_ids[-1],
+        'semester': first_class['semester'],
+        'section': first_class['section'],
+        'subject_id': semester_subjects[first_class['semester']][0],
+        'student_id': student_ids[0],
+        'final_student_id': final_student_id,
+        'students': len(student_ids),
+        'statuses': len(statuses)
+    }
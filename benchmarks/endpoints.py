@@ -0,0 +1,79 @@
+# Endpoints under benchmark. `budget` is the most MongoDB commands a cold
+# request may issue (caches empty); warm requests must stay within it too.
+# Budgets do not depend on dataset size: a count that grows with the number
+# of students or staff is an N+1 and should fail the run. They leave a few
+# commands of headroom for getMore on large cursors.
+# URL and body templates are filled from the ids generate_department()
+# returns. Server-sent events, exports, uploads and certificate jobs stream
+# or run in the background, so they are left out. `repeat_status` is an
+# error status the warm runs of a create may answer with once the cold run
+# has created the document (duplicate checks).
+
+class Endpoint:
+    def __init__(self, name, role, url, budget, method='GET', body=None, repeat_status=None):
+        self.name = name
+        self.role = role
+        self.url = url
+        self.budget = budget
+        self.method = method
+        self.body = body
+        self.repeat_status = repeat_status
+
+    def request(self, ids):
+        body = {key: value.format(**ids) if isinstance(value, str) else value
+                for key, value in (self.body or {}).items()}
+        return self.method, self.url.format(**ids), body or None
+
+ENDPOINTS = [
+    Endpoint('student subjects', 'student', '/student/api/subjects', 7),
+    Endpoint('student final status', 'student', '/student/api/final-approval-status', 6),
+
+    Endpoint('staff assigned subjects', 'staff', '/staff/api/assigned-subjects', 9),
+    Endpoint('staff students', 'staff', '/staff/api/students/{subject_id}/{section}', 8),
+    Endpoint('staff students pending', 'staff', '/staff/api/students/{subject_id}/{section}?status=pending', 8),
+    Endpoint('staff student counts', 'staff', '/staff/api/student-counts/{subject_id}/{section}', 8),
+
+    Endpoint('hod department students', 'hod', '/hod/api/department-students', 6),
+    Endpoint('hod staff', 'hod', '/hod/api/staff', 8),
+    Endpoint('hod subjects', 'hod', '/hod/api/subjects', 9),
+    Endpoint('hod classes', 'hod', '/hod/api/classes', 9),
+    Endpoint('hod classes statistics', 'hod', '/hod/api/classes/statistics', 11),
+    Endpoint('hod class statistics', 'hod', '/hod/api/class-statistics/{class_id}', 11),
+    Endpoint('hod subject statistics', 'hod', '/hod/api/subject-statistics/{subject_id}', 8),
+    Endpoint('hod subjects statistics', 'hod', '/hod/api/subjects/statistics', 11),
+    Endpoint('hod class students', 'hod', '/hod/api/class-students/{class_id}', 11),
+    Endpoint('hod class matrix', 'hod', '/hod/api/class-matrix/{class_id}', 11),
+    Endpoint('hod class subjects', 'hod', '/hod/api/class-subjects/{class_id}/{semester}', 11),
+    Endpoint('hod class subject count', 'hod', '/hod/api/class-subject-count/{class_id}/{semester}', 7),
+    Endpoint('hod cache stats', 'hod', '/hod/api/cache-stats', 3),
+
+    # Writes repeat the same decision on every run. Approve-pending only has
+    # pending students on the cold run; later runs measure the lookups alone.
+    Endpoint('staff approve student', 'staff', '/staff/api/approve-student', 7, method='POST', body={
+        'student_id': '{student_id}', 'subject_id': '{subject_id}', 'action': 'approve', 'remarks': ''
+    }),
+    Endpoint('staff approve pending', 'staff', '/staff/api/approve-students', 10, method='POST', body={
+        'subject_id': '{subject_id}', 'class_section': '{section}', 'all_pending': True, 'action': 'approve'
+    }),
+    Endpoint('hod final approve', 'hod', '/hod/api/final-approve', 7, method='POST', body={
+        'student_id': '{final_student_id}', 'action': 'approve', 'remarks': ''
+    }),
+    Endpoint('hod bulk approve preview', 'hod', '/hod/api/final-approve/bulk', 10, method='POST', body={
+        'class_id': '{class_id}', 'dry_run': True
+    }),
+    Endpoint('hod create class', 'hod', '/hod/api/create-class', 6, method='POST', body={
+        'name': 'Bench Year 4 Section Z', 'year': 4, 'semester': 8, 'section': 'Z'
+    }, repeat_status=400),
+    Endpoint('hod create subject', 'hod', '/hod/api/create-subject', 9, method='POST', body={
+        'name': 'Bench Elective', 'code': 'BENCHNEW', 'semester': '{semester}', 'credits': 3
+    }, repeat_status=400),
+    Endpoint('hod assign class advisor', 'hod', '/hod/api/assign-class-advisor', 7, method='POST', body={
+        'class_id': '{class_id}', 'staff_id': '{staff}'
+    }),
+    Endpoint('hod assign subject', 'hod', '/hod/api/assign-subject', 6, method='POST', body={
+        'staff_id': '{staff}', 'subject_id': '{subject_id}', 'class_id': '{other_class_id}'
+    }, repeat_status=400),
+    # Last: it changes the student's final status for the runs after it
+    Endpoint('student request final', 'student', '/student/api/request-final-approval', 9,
+             method='POST', repeat_status=400),
+]
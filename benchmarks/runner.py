@@ -0,0 +1,100 @@
+import statistics
+import threading
+import time
+from pymongo import monitoring
+from query_timing import IGNORED_COMMANDS
+
+# Caches cleared before the cold request of each endpoint
+CACHES = ('user_cache', 'reference_cache', 'version_cache', 'term_cache')
+
+class CommandCounter(monitoring.CommandListener):
+    # Counts the commands the app sends; register it through the
+    # MONGO_EVENT_LISTENERS config key before the first request.
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name.lower() not in IGNORED_COMMANDS:
+            with self._lock:
+                self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+class Result:
+    def __init__(self, endpoint, status, cold_commands, warm_commands, timings):
+        self.endpoint = endpoint
+        self.status = status
+        self.cold_commands = cold_commands
+        self.warm_commands = warm_commands
+        self.timings = timings
+
+    @property
+    def ok(self):
+        return 200 <= self.status < 300
+
+    @property
+    def within_budget(self):
+        return max(self.cold_commands, self.warm_commands) <= self.endpoint.budget
+
+    def percentile(self, p):
+        timings = sorted(self.timings)
+        if not timings:
+            return 0.0
+        return timings[min(len(timings) - 1, round(p / 100 * (len(timings) - 1)))]
+
+def _login(client, user_id, role):
+    with client.session_transaction() as session:
+        session['user_id'] = user_id
+        session['user_role'] = role
+
+def _call(client, counter, method, url, body):
+    before = counter.count
+    started = time.perf_counter()
+    response = client.open(url, method=method, json=body)
+    response.get_data()
+    elapsed = (time.perf_counter() - started) * 1000
+    return response.status_code, counter.count - before, elapsed
+
+def run(app, counter, endpoints, ids, repeat=20):
+    client = app.test_client()
+    users = {'student': ids['student_id'], 'staff': ids['staff'], 'hod': ids['hod']}
+    results = []
+    for endpoint in endpoints:
+        _login(client, users[endpoint.role], endpoint.role)
+        method, url, body = endpoint.request(ids)
+
+        for name in CACHES:
+            cache = app.extensions.get(name)
+            if cache is not None:
+                cache.clear()
+        status, cold_commands, _ = _call(client, counter, method, url, body)
+
+        warm_commands = 0
+        timings = []
+        for _ in range(repeat):
+            warm_status, commands, elapsed = _call(client, counter, method, url, body)
+            if not 200 <= warm_status < 300 and warm_status != endpoint.repeat_status:
+                status = warm_status
+            warm_commands = max(warm_commands, commands)
+            timings.append(elapsed)
+        results.append(Result(endpoint, status, cold_commands, warm_commands, timings))
+    return results
+
+def report(results, out):
+    out.write(f"{'endpoint':<28} {'status':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+              f"{'cold':>5} {'warm':>5} {'budget':>6}\n")
+    for result in results:
+        flag = '' if result.ok and result.within_budget else '  <-- FAIL'
+        out.write(f'{result.endpoint.name:<28} {result.status:>6} {result.percentile(50):>8.1f} '
+                  f'{result.percentile(95):>8.1f} {result.percentile(99):>8.1f} '
+                  f'{result.cold_commands:>5} {result.warm_commands:>5} {result.endpoint.budget:>6}{flag}\n')
+    if results:
+        median = statistics.median(t for result in results for t in result.timings) if any(r.timings for r in results) else 0
+        out.write(f'\nmedian over all requests: {median:.1f} ms\n')
+    return all(result.ok and result.within_budget for result in results)
@@ -0,0 +1,119 @@
+import argparse
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from flask import Flask
+from compression import brotli, compress
+from json_provider import JSONProvider, OrjsonProvider, orjson
+
+# python -m benchmarks.serialization [--students 500] [--repeat 50]
+#
+# Serialization and compression cost of the largest API payloads, built in
+# memory with the same shapes the endpoints return: a full page of
+# department-students, a class-students page with teacher notes and raw
+# status documents with ObjectIds and datetimes. No database is needed.
+
+def department_students(rnd, count, subjects):
+    return [{
+        'id': str(ObjectId()),
+        'name': f'Student {n}',
+        'roll_number': f'CSE{n:05d}',
+        'class_section': rnd.choice('ABCD'),
+        'year': rnd.randint(1, 4),
+        'semester': rnd.randint(1, 8),
+        'approved_subjects': rnd.randint(0, subjects),
+        'total_subjects': subjects,
+        'final_status': rnd.choice(['not_requested', 'pending', 'approved', 'rejected']),
+        'final_remarks': rnd.choice([None, '', 'Cleared', 'Library book overdue'])
+    } for n in range(count)]
+
+def class_students(rnd, count, subjects):
+    rows = department_students(rnd, count, subjects)
+    for row in rows:
+        row.pop('class_section')
+        row.pop('year')
+        row.pop('semester')
+        row['teacher_notes'] = [{
+            'subject': f'Subject {s}',
+            'remarks': rnd.choice(['Lab record pending', 'Assignment 3 missing', 'ok', 'Submit the project report']),
+            'teacher_name': f'Teacher {rnd.randint(1, 12)}'
+        } for s in range(subjects) if rnd.random() < 0.5]
+    return rows
+
+def status_documents(rnd, count, subjects):
+    now = datetime(2026, 1, 1)
+    return [{
+        '_id': ObjectId(),
+        'student_id': str(ObjectId()),
+        'subject_id': str(ObjectId()),
+        'status': rnd.choice(['approved', 'rejected']),
+        'approved_by': ObjectId(),
+        'remarks': rnd.choice(['', 'ok', 'lab']),
+        'created_at': now,
+        'updated_at': now + timedelta(minutes=rnd.randint(0, 100000))
+    } for _ in range(count * subjects)]
+
+PAYLOADS = {
+    'department-students': department_students,
+    'class-students+notes': class_students,
+    'raw statuses': status_documents,
+}
+
+def _best_ms(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None or elapsed < best else best
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.serialization',
+                                     description='JSON provider and response compression micro-benchmark.')
+    parser.add_argument('--students', type=int, default=500, help='rows per payload (500 is the page size cap)')
+    parser.add_argument('--subjects', type=int, default=6, help='subjects per semester')
+    parser.add_argument('--repeat', type=int, default=50, help='runs per measurement; the best is reported')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    app = Flask('benchmark')
+    providers = [('json', JSONProvider(app))]
+    if orjson is not None:
+        providers.append(('orjson', OrjsonProvider(app)))
+    else:
+        print('orjson is not installed; only the stdlib provider is measured')
+    encodings = [('gzip', {'gzip_level': level}, f'gzip -{level}') for level in (1, 6, 9)]
+    if brotli is not None:
+        encodings += [('br', {'brotli_quality': quality}, f'br q{quality}') for quality in (4, 11)]
+
+    rnd = random.Random(args.seed)
+    ok = True
+    print(f"{'payload':<22} {'provider':<8} {'bytes':>9} {'ms':>8} {'speedup':>8}")
+    bodies = {}
+    for name, build in PAYLOADS.items():
+        payload = build(rnd, args.students, args.subjects)
+        baseline = None
+        for provider_name, provider in providers:
+            body = provider.response(payload).get_data()
+            ms = _best_ms(lambda: provider.response(payload), args.repeat)
+            baseline = baseline or ms
+            print(f'{name:<22} {provider_name:<8} {len(body):>9} {ms:>8.2f} {baseline / ms:>7.1f}x')
+            if name in bodies and json.loads(body) != json.loads(bodies[name]):
+                print(f'  {provider_name} output differs from json for {name}')
+                ok = False
+            bodies.setdefault(name, body)
+
+    print(f"\n{'payload':<22} {'encoding':<8} {'bytes':>9} {'ratio':>7} {'ms':>8}")
+    for name, body in bodies.items():
+        for encoding, options, label in encodings:
+            size = len(compress(body, encoding, **options))
+            ms = _best_ms(lambda: compress(body, encoding, **options), args.repeat)
+            print(f'{name:<22} {label:<8} {size:>9} {len(body) / size:>6.1f}x {ms:>8.2f}')
+    return ok
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -1,21 +1,40 @@
 from flask import Blueprint, request, jsonify, session, redirect, url_for
-from werkzeug.security import generate_password_hash, check_password_hash
+from pymongo.errors import DuplicateKeyError
 from database import get_db
+from current_user import invalidate_user
+from reference_data import invalidate_department
+from passwords import HasherBusy, hash_password, verify_password
+from repositories import users
 from bson import ObjectId
 from datetime import datetime
 
 auth_bp = Blueprint('auth', __name__)
 
+def _busy():
+    return jsonify({
+        'success': False,
+        'message': 'Server busy, please try again'
+    }), 503, {'Retry-After': '2'}
+
 @auth_bp.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
     email = data.get('email')
     password = data.get('password')
     
-    db = get_db()
-    user = db.users.find_one({'email': email})
+    user = users.find_credentials(email)
+    
+    try:
+        matches, new_hash = verify_password(user['password'], password) if user else (False, None)
+    except HasherBusy:
+        return _busy()
     
-    if user and user['password'] == password:
+    if matches:
+        if new_hash:
+            # Plaintext or outdated hash; store it with the current method
+            users.replace_password(user['_id'], user['password'], new_hash)
+        # Also drops a profile cached before the rehash or a role change
+        invalidate_user(user['_id'])
         session['user_id'] = str(user['_id'])
         session['user_role'] = user['role']
         session['user_name'] = user['name']
@@ -45,11 +64,16 @@ def register():
             'message': 'Email already registered'
         }), 400
     
+    try:
+        password_hash = hash_password(data.get('password') or '')
+    except HasherBusy:
+        return _busy()
+    
     # Create new user
     user_data = {
         'name': data.get('name'),
         'email': data.get('email'),
-        'password': data.get('password'),
+        'password': password_hash,
         'role': data.get('role'),
         'department': data.get('department'),
         'class_section': data.get('class_section'),
@@ -59,15 +83,34 @@ def register():
         'created_at': datetime.utcnow()
     }
     
-    db.users.insert_one(user_data)
+    try:
+        db.users.insert_one(user_data)
+    except DuplicateKeyError as e:
+        # Lost a race with another registration, or the roll number is taken
+        return jsonify({
+            'success': False,
+            'message': _duplicate_message(e)
+        }), 400
+    invalidate_user(user_data['_id'])
+    # New students and staff show up in the department's listings
+    invalidate_department(user_data['department'])
     
     return jsonify({
         'success': True,
         'message': 'Registration successful'
     })
 
+def _duplicate_message(error):
+    # Which unique index rejected the insert: email_unique or department_roll_number_unique
+    key_pattern = (error.details or {}).get('keyPattern') or {}
+    if 'roll_number' in key_pattern or 'department_roll_number_unique' in str(error):
+        return 'Roll number already registered in this department'
+    return 'Email already registered'
+
 @auth_bp.route('/logout', methods=['POST'])
 def logout():
+    if 'user_id' in session:
+        invalidate_user(session['user_id'])
     session.clear()
     return jsonify({
         'success': True,
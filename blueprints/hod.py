@@ -1,7 +1,23 @@
-from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for
-from database import get_db
+import asyncio
+import io
 from bson import ObjectId
-from datetime import datetime
+from bson.errors import InvalidId
+from flask import (Blueprint, Response, render_template, request, jsonify, session, redirect, url_for,
+                   stream_with_context, send_file, current_app)
+from current_user import get_current_user
+from pagination import page_args, paginated_response, bool_arg
+from reference_data import get_reference_data, invalidate_department, get_class, get_staff_name, reference_cache_stats
+from events import event_stream, push_enabled, publish_progress
+from etags import conditional, department_scopes, bump, progress_scope, reference_scope, student_scope
+from clearance import get_clearances, record_final_status, record_final_statuses, record_subject_created
+from reports import no_due_header, no_due_rows, stream_csv, stream_xlsx
+from roster import RosterError, read_roster, refresh_department, start_import, write_roster
+from database import run_async
+from class_matrix import load_class_matrix
+from terms import current_term
+from certificates import approved_certificates, archive_path, renders_inline, start_job
+from repositories import (analytics, certificate_jobs, classes, final_approvals, no_due_status, roster_jobs,
+                          staff_subjects, subjects, users)
 from functools import wraps
 
 hod_bp = Blueprint('hod', __name__)
@@ -17,48 +33,158 @@ def hod_required(f):
 @hod_bp.route('/dashboard')
 @hod_required
 def dashboard():
-    return render_template('hod_dashboard.html')
+    return render_template('hod_dashboard.html', events_push=push_enabled())
 
 @hod_bp.route('/api/department-students')
 @hod_required
+@conditional(department_scopes(reference_scope, progress_scope))
 def get_department_students():
-    db = get_db()
-    hod = db.users.find_one({'_id': ObjectId(session['user_id'])})
-    students = list(db.users.find({
-        'role': 'student',
-        'department': hod['department']
-    }))
+    hod = get_current_user()
+    limit, after = page_args()
+    
+    students = users.department_progress(
+        hod.department,
+        after=after,
+        limit=limit,
+        class_section=request.args.get('section') or None,
+        final_status=request.args.get('final_status') or None,
+        has_pending=bool_arg('has_pending')
+    )
     
     students_data = []
     for student in students:
-        # Get subject approval count
-        total_subjects = db.subjects.count_documents({
-            'department': student['department'],
-            'semester': student['semester']
-        })
-        
-        approved_subjects = db.no_due_status.count_documents({
-            'student_id': str(student['_id']),
-            'status': 'approved'
-        })
-        
-        # Get final approval status
-        final_approval = db.final_approvals.find_one({'student_id': str(student['_id'])})
-        
         students_data.append({
-            'id': str(student['_id']),
-            'name': student['name'],
-            'roll_number': student['roll_number'],
-            'class_section': student['class_section'],
-            'year': student['year'],
-            'semester': student['semester'],
-            'approved_subjects': approved_subjects,
-            'total_subjects': total_subjects,
-            'final_status': final_approval['status'] if final_approval else 'not_requested',
-            'final_remarks': final_approval['remarks'] if final_approval else None
+            'id': student.id,
+            'name': student.name,
+            'roll_number': student.roll_number,
+            'class_section': student.class_section,
+            'year': student.year,
+            'semester': student.semester,
+            'approved_subjects': student.approved_subjects,
+            'total_subjects': student.total_subjects,
+            'final_status': student.final_status,
+            'final_remarks': student.final_remarks
         })
     
-    return jsonify(students_data)
+    return paginated_response(students_data, limit)
+
+@hod_bp.route('/api/export/no-due.<fmt>')
+@hod_required
+def export_no_due(fmt):
+    if fmt not in ('csv', 'xlsx'):
+        return jsonify({'success': False, 'message': 'Unsupported export format'}), 404
+    
+    department = get_current_user().department
+    class_section = request.args.get('section') or None
+    reference = get_reference_data(department)
+    
+    # Status columns cover every subject of the department, grouped by semester
+    columns = sorted(reference['subjects'].values(), key=lambda subject: (subject.semester or 0, subject.code or ''))
+    header = no_due_header(columns)
+    rows = no_due_rows(department, columns, class_section)
+    
+    filename = f"no-due-{department}{'-' + class_section if class_section else ''}.{fmt}"
+    if fmt == 'csv':
+        body = stream_csv(header, rows)
+        mimetype = 'text/csv'
+    else:
+        body = stream_xlsx(header, rows, sheet_name=f'{department} no-due')
+        mimetype = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@hod_bp.route('/api/import/students', methods=['POST'])
+@hod_required
+def import_student_roster():
+    # Accepts a multipart upload in `file` or a raw text/csv body. With
+    # BACKGROUND_JOBS the rows are written by a job (202); poll it for the
+    # result. Otherwise the import runs here, for small rosters only.
+    upload = request.files.get('file')
+    if upload is not None:
+        stream = upload.stream
+    elif request.mimetype == 'text/csv':
+        stream = request.stream
+    else:
+        return jsonify({
+            'success': False,
+            'message': 'Upload a CSV file'
+        }), 400
+    
+    hod = get_current_user()
+    reference = get_reference_data(hod.department)
+    try:
+        rows, errors = read_roster(
+            hod.department,
+            reference['classes'].values(),
+            io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+        )
+    except (RosterError, UnicodeDecodeError) as e:
+        return jsonify({
+            'success': False,
+            'message': str(e) if isinstance(e, RosterError) else 'The file is not UTF-8 encoded CSV'
+        }), 400
+    
+    if rows and current_app.config.get('BACKGROUND_JOBS', True):
+        job = roster_jobs.get(start_import(hod.department, rows, errors))
+        return _roster_job_response(job), 202
+    
+    limit = current_app.config.get('ROSTER_INLINE_ROWS', 100)
+    if len(rows) > limit:
+        return jsonify({
+            'success': False,
+            'message': f'{len(rows)} rows to import; split the file into parts of at most {limit} rows'
+        }), 413
+    
+    credentials = []
+    imported = write_roster(hod.department, rows, errors, credentials)
+    if imported:
+        refresh_department(hod.department)
+    return _roster_result(imported, errors, credentials)
+
+def _roster_result(imported, errors, credentials):
+    return jsonify({
+        'success': not errors,
+        'status': 'done',
+        'message': f'{imported} students imported, {len(errors)} rows rejected',
+        'imported': imported,
+        'errors': errors,
+        # Generated passwords, shown only in this response; nothing else can recover them
+        'credentials': credentials
+    }), 200, {'Cache-Control': 'no-store'}
+
+def _roster_job_response(job):
+    return jsonify({
+        'success': True,
+        'job_id': job['_id'],
+        'status': job['status'],
+        'total': job['total'],
+        'done': job['done'],
+        'imported': job['imported']
+    })
+
+@hod_bp.route('/api/import/students/<job_id>')
+@hod_required
+def get_roster_job(job_id):
+    job = roster_jobs.get(job_id)
+    if not job or job['department'] != get_current_user().department:
+        return jsonify({
+            'success': False,
+            'message': 'Import job not found'
+        }), 404
+    if job['status'] != 'done':
+        return _roster_job_response(job)
+    # The generated passwords are handed out once, then dropped from the job
+    job = roster_jobs.take_result(job_id) or job
+    return _roster_result(job['imported'], job.get('errors', []), job.get('credentials', []))
+
+@hod_bp.route('/api/events')
+@hod_required
+def events():
+    return event_stream([f'department:{get_current_user().department}'])
 
 @hod_bp.route('/api/final-approve', methods=['POST'])
 @hod_required
@@ -68,133 +194,343 @@ def final_approve():
     action = data.get('action')  # approve or reject
     remarks = data.get('remarks', '')
     
-    db = get_db()
-    final_approval = db.final_approvals.find_one({'student_id': student_id})
-    if not final_approval:
+    status = 'approved' if action == 'approve' else 'rejected'
+    updated_at = final_approvals.decide(student_id, status, session['user_id'], remarks)
+    if not updated_at:
         return jsonify({
             'success': False,
             'message': 'No final approval request found'
         }), 404
     
-    update_data = {
-        'status': 'approved' if action == 'approve' else 'rejected',
-        'approved_by': session['user_id'],
-        'remarks': remarks,
-        'updated_at': datetime.utcnow()
-    }
+    record_final_status(student_id, status, remarks, updated_at)
+    department = get_current_user().department
+    bump(student_scope(student_id), progress_scope(department))
+    publish_progress(department, [student_id])
     
-    db.final_approvals.update_one(
-        {'_id': final_approval['_id']},
-        {'$set': update_data}
+    return jsonify({
+        'success': True,
+        'message': f'Final approval {action}d successfully'
+    })
+
+def _bulk_skip_reason(student, include_unrequested, listed):
+    # Why a student is left out of a bulk final approval, or None
+    if student.total_subjects == 0:
+        return 'No subjects for the semester'
+    if student.approved_subjects < student.total_subjects:
+        return f'{student.approved_subjects} of {student.total_subjects} subjects approved'
+    if student.final_status == 'approved':
+        return 'Already approved'
+    if student.final_status == 'rejected' and not listed:
+        return 'Final approval was rejected; list the student explicitly to approve'
+    if student.final_status == 'not_requested' and not include_unrequested:
+        return 'Final approval not requested'
+    return None
+
+@hod_bp.route('/api/final-approve/bulk', methods=['POST'])
+@hod_required
+def bulk_final_approve():
+    # Approves every fully cleared student in the department, narrowed by
+    # class_id, semester, class_section or an explicit student_ids list.
+    # include_unrequested also approves students who never asked; dry_run
+    # only reports what would happen.
+    data = request.get_json() or {}
+    hod = get_current_user()
+    
+    year = None
+    semester = data.get('semester')
+    class_section = data.get('class_section') or None
+    if semester in (None, ''):
+        semester = None
+    elif isinstance(semester, bool) or not str(semester).isdigit():
+        return jsonify({
+            'success': False,
+            'message': 'semester must be a number'
+        }), 400
+    else:
+        semester = int(semester)
+    if class_section is not None and not isinstance(class_section, str):
+        return jsonify({
+            'success': False,
+            'message': 'class_section must be a string'
+        }), 400
+    if data.get('class_id'):
+        try:
+            class_obj = get_class(get_reference_data(hod.department), data['class_id'])
+        except InvalidId:
+            class_obj = None
+        if not class_obj or class_obj.department != hod.department:
+            return jsonify({
+                'success': False,
+                'message': 'Class not found'
+            }), 404
+        year, semester, class_section = class_obj.year, class_obj.semester, class_obj.section
+    
+    student_ids = data.get('student_ids')
+    if student_ids is not None and (not isinstance(student_ids, list)
+                                    or not all(isinstance(student_id, str) for student_id in student_ids)):
+        return jsonify({
+            'success': False,
+            'message': 'student_ids must be a list of strings'
+        }), 400
+    listed = set(student_ids or [])
+    candidates = users.final_approval_candidates(
+        hod.department, year=year, semester=semester,
+        class_section=class_section, student_ids=student_ids
     )
     
+    approved = []
+    skipped = []
+    for student in candidates:
+        entry = {'id': student.id, 'name': student.name, 'roll_number': student.roll_number}
+        reason = _bulk_skip_reason(student, bool(data.get('include_unrequested')), student.id in listed)
+        if reason:
+            skipped.append(dict(entry, reason=reason))
+        else:
+            approved.append(entry)
+    found = {student.id for student in candidates}
+    skipped.extend({'id': student_id, 'name': None, 'roll_number': None, 'reason': 'Student not found in department'}
+                   for student_id in listed - found)
+    
+    if approved and not data.get('dry_run'):
+        approved_ids = [entry['id'] for entry in approved]
+        remarks = data.get('remarks', '')
+        updated_at = final_approvals.approve_many(approved_ids, session['user_id'], remarks)
+        record_final_statuses(approved_ids, 'approved', remarks, updated_at)
+        bump(progress_scope(hod.department), *(student_scope(student_id) for student_id in approved_ids))
+        publish_progress(hod.department, approved_ids)
+    
     return jsonify({
         'success': True,
-        'message': f'Final approval {action}d successfully'
+        'dry_run': bool(data.get('dry_run')),
+        'message': f"{len(approved)} students {'would be ' if data.get('dry_run') else ''}approved, {len(skipped)} skipped",
+        'approved': approved,
+        'skipped': skipped
     })
 
+@hod_bp.route('/api/certificates', methods=['POST'])
+@hod_required
+def generate_certificates():
+    # Certificates for every approved student of the department, or of one
+    # class with class_id. Poll the returned job for progress, then download.
+    data = request.get_json(silent=True) or {}
+    hod = get_current_user()
+    reference = get_reference_data(hod.department)
+    
+    year = semester = class_section = None
+    download_name = f'no-due-certificates-{hod.department}'
+    if data.get('class_id'):
+        try:
+            class_obj = get_class(reference, data['class_id'])
+        except InvalidId:
+            class_obj = None
+        if not class_obj or class_obj.department != hod.department:
+            return jsonify({
+                'success': False,
+                'message': 'Class not found'
+            }), 404
+        year, semester, class_section = class_obj.year, class_obj.semester, class_obj.section
+        download_name += f'-{class_obj.year}-{class_obj.section}'
+    
+    certificates = approved_certificates(reference, hod.department, year, semester, class_section)
+    if not certificates:
+        return jsonify({
+            'success': False,
+            'message': 'No students with an approved final approval'
+        }), 404
+    
+    limit = current_app.config.get('CERTIFICATE_INLINE_LIMIT', 500)
+    if len(certificates) > limit and renders_inline():
+        return jsonify({
+            'success': False,
+            'message': f'{len(certificates)} certificates requested; generate them one class at a time '
+                       f'(at most {limit} at once)'
+        }), 413
+    
+    job = certificate_jobs.get(start_job(certificates, hod.department, f'{download_name}.zip'))
+    return _certificate_job_response(job), 202 if job['status'] == 'running' else 200
+
+def _certificate_job_response(job):
+    return jsonify({
+        'success': job['status'] != 'failed',
+        'job_id': job['_id'],
+        'status': job['status'],
+        'total': job['total'],
+        'done': job['done'],
+        'cached': job['cached'],
+        'message': job['message']
+    })
+
+def _certificate_job(job_id):
+    job = certificate_jobs.get(job_id)
+    return job if job and job['department'] == get_current_user().department else None
+
+@hod_bp.route('/api/certificates/<job_id>')
+@hod_required
+def get_certificate_job(job_id):
+    job = _certificate_job(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': 'Certificate job not found'
+        }), 404
+    return _certificate_job_response(job)
+
+@hod_bp.route('/api/certificates/<job_id>/download')
+@hod_required
+def download_certificates(job_id):
+    job = _certificate_job(job_id)
+    if not job:
+        return jsonify({
+            'success': False,
+            'message': 'Certificate job not found'
+        }), 404
+    if job['status'] != 'ready':
+        return jsonify({
+            'success': False,
+            'message': 'Certificates are not ready yet'
+        }), 409
+    path = archive_path(job)
+    if not path:
+        return jsonify({
+            'success': False,
+            'message': 'Certificates are no longer available, generate them again'
+        }), 410
+    return send_file(path, mimetype='application/zip', as_attachment=True,
+                     download_name=job['download_name'])
+
 @hod_bp.route('/api/staff')
 @hod_required
+@conditional(department_scopes(reference_scope))
 def get_staff():
-    db = get_db()
-    hod = db.users.find_one({'_id': ObjectId(session['user_id'])})
-    staff = list(db.users.find({
-        'role': 'staff',
-        'department': hod['department']
-    }))
+    hod = get_current_user()
+    staff = users.find_staff(hod.department)
+    staff_ids = [member.id for member in staff]
+    assignments = staff_subjects.counts_for_staff(staff_ids)
+    advised = classes.counts_advised_by(staff_ids)
     
     staff_data = []
     for member in staff:
-        assignments = db.staff_subjects.count_documents({'staff_id': str(member['_id'])})
-        advised_classes = db.classes.count_documents({'class_advisor_id': str(member['_id'])})
         staff_data.append({
-            'id': str(member['_id']),
-            'name': member['name'],
-            'email': member['email'],
-            'assignments': assignments,
-            'advised_classes': advised_classes
+            'id': member.id,
+            'name': member.name,
+            'email': member.email,
+            'assignments': assignments.get(member.id, 0),
+            'advised_classes': advised.get(member.id, 0)
         })
     
     return jsonify(staff_data)
 
 @hod_bp.route('/api/subjects')
 @hod_required
+@conditional(department_scopes(reference_scope))
 def get_subjects():
-    db = get_db()
-    hod = db.users.find_one({'_id': ObjectId(session['user_id'])})
-    subjects = list(db.subjects.find({'department': hod['department']}))
+    hod = get_current_user()
+    reference = get_reference_data(hod.department)
     
     subjects_data = []
-    for subject in subjects:
-        class_info = db.classes.find_one({'_id': ObjectId(subject['class_id'])}) if subject.get('class_id') else None
+    for subject in reference['subjects'].values():
+        class_info = get_class(reference, subject.class_id) if subject.class_id else None
         subjects_data.append({
-            'id': str(subject['_id']),
-            'name': subject['name'],
-            'code': subject['code'],
-            'semester': subject['semester'],
-            'credits': subject['credits'],
-            'class_name': class_info['name'] if class_info else 'Not assigned'
+            'id': subject.id,
+            'name': subject.name,
+            'code': subject.code,
+            'semester': subject.semester,
+            'credits': subject.credits,
+            'class_name': class_info.name if class_info else 'Not assigned'
         })
     
     return jsonify(subjects_data)
 
 @hod_bp.route('/api/classes')
 @hod_required
+@conditional(department_scopes(reference_scope))
 def get_classes():
-    db = get_db()
-    hod = db.users.find_one({'_id': ObjectId(session['user_id'])})
-    classes = list(db.classes.find({'department': hod['department']}))
+    hod = get_current_user()
+    reference = get_reference_data(hod.department)
+    
+    subject_counts = {}
+    for subject in reference['subjects'].values():
+        subject_counts[subject.class_id] = subject_counts.get(subject.class_id, 0) + 1
     
     classes_data = []
-    for cls in classes:
-        advisor = db.users.find_one({'_id': ObjectId(cls['class_advisor_id'])}) if cls.get('class_advisor_id') else None
-        subject_count = db.subjects.count_documents({'class_id': str(cls['_id'])})
+    for cls in reference['classes'].values():
+        advisor_name = get_staff_name(reference, cls.class_advisor_id) if cls.class_advisor_id else None
         
         classes_data.append({
-            'id': str(cls['_id']),
-            'name': cls['name'],
-            'year': cls['year'],
-            'semester': cls['semester'],
-            'section': cls['section'],
-            'advisor_name': advisor['name'] if advisor else 'Not assigned',
-            'advisor_id': str(cls['class_advisor_id']) if cls.get('class_advisor_id') else None,
-            'subject_count': subject_count
+            'id': cls.id,
+            'name': cls.name,
+            'year': cls.year,
+            'semester': cls.semester,
+            'section': cls.section,
+            'advisor_name': advisor_name or 'Not assigned',
+            'advisor_id': cls.class_advisor_id,
+            'subject_count': subject_counts.get(cls.id, 0)
         })
     
     return jsonify(classes_data)
 
+@hod_bp.route('/api/classes/statistics')
+@hod_required
+@conditional(department_scopes(reference_scope, progress_scope))
+def get_all_class_statistics():
+    hod = get_current_user()
+    reference = get_reference_data(hod.department)
+    
+    # Subject count per semester for the whole department
+    subject_counts = {}
+    for subject in reference['subjects'].values():
+        subject_counts[subject.semester] = subject_counts.get(subject.semester, 0) + 1
+    
+    # Tally students per (year, semester, section)
+    students = list(users.find_students(hod.department))
+    clearances = get_clearances(students)
+    totals = {}
+    for student in students:
+        clearance = clearances[student.id]
+        tally = totals.setdefault((student.year, student.semester, student.class_section), [0, 0])
+        tally[0] += 1
+        tally[1] += 1 if clearance.all_approved and clearance.total_count > 0 else 0
+    
+    statistics = {}
+    for cls in reference['classes'].values():
+        total_students, completed_dues = totals.get((cls.year, cls.semester, cls.section), (0, 0))
+        statistics[cls.id] = {
+            'total_students': total_students,
+            'completed_dues': completed_dues,
+            'pending_dues': total_students - completed_dues,
+            'subject_count': subject_counts.get(cls.semester, 0)
+        }
+    
+    return jsonify(statistics)
+
+@hod_bp.route('/api/cache-stats')
+@hod_required
+def get_cache_stats():
+    return jsonify({
+        'reference_data': reference_cache_stats()
+    })
+
 @hod_bp.route('/api/create-class', methods=['POST'])
 @hod_required
 def create_class():
     data = request.get_json()
-    db = get_db()
-    hod = db.users.find_one({'_id': ObjectId(session['user_id'])})
+    hod = get_current_user()
     
     # Check if class already exists
-    existing = db.classes.find_one({
-        'department': hod['department'],
-        'year': int(data.get('year')),
-        'semester': int(data.get('semester')),
-        'section': data.get('section')
-    })
-    
-    if existing:
+    if classes.exists(hod.department, int(data.get('year')), int(data.get('semester')), data.get('section')):
         return jsonify({
             'success': False,
             'message': 'Class already exists'
         }), 400
     
-    new_class_data = {
-        'name': data.get('name'),
-        'department': hod['department'],
-        'year': int(data.get('year')),
-        'semester': int(data.get('semester')),
-        'section': data.get('section'),
-        'class_advisor_id': None,
-        'created_at': datetime.utcnow()
-    }
-    
-    db.classes.insert_one(new_class_data)
+    classes.insert(
+        name=data.get('name'),
+        department=hod.department,
+        year=int(data.get('year')),
+        semester=int(data.get('semester')),
+        section=data.get('section')
+    )
+    invalidate_department(hod.department)
     
     return jsonify({
         'success': True,
@@ -205,32 +541,27 @@ def create_class():
 @hod_required
 def create_subject():
     data = request.get_json()
-    db = get_db()
-    hod = db.users.find_one({'_id': ObjectId(session['user_id'])})
+    hod = get_current_user()
     
     # Check if subject code already exists
-    existing = db.subjects.find_one({
-        'code': data.get('code'),
-        'department': hod['department']
-    })
-    
-    if existing:
+    if subjects.code_exists(hod.department, data.get('code')):
         return jsonify({
             'success': False,
             'message': 'Subject code already exists'
         }), 400
     
-    new_subject_data = {
-        'name': data.get('name'),
-        'code': data.get('code'),
-        'department': hod['department'],
-        'semester': int(data.get('semester')),
-        'credits': int(data.get('credits', 3)),
-        'class_id': data.get('class_id') if data.get('class_id') else None,
-        'created_at': datetime.utcnow()
-    }
-    
-    db.subjects.insert_one(new_subject_data)
+    semester = int(data.get('semester'))
+    subject_id = subjects.insert(
+        name=data.get('name'),
+        code=data.get('code'),
+        department=hod.department,
+        semester=semester,
+        credits=int(data.get('credits', 3)),
+        class_id=data.get('class_id') if data.get('class_id') else None
+    )
+    invalidate_department(hod.department)
+    record_subject_created(hod.department, semester, subject_id)
+    bump(progress_scope(hod.department))
     
     return jsonify({
         'success': True,
@@ -244,9 +575,8 @@ def assign_class_advisor():
     class_id = data.get('class_id')
     staff_id = data.get('staff_id')
     
-    db = get_db()
-    class_obj = db.classes.find_one({'_id': ObjectId(class_id)})
-    staff = db.users.find_one({'_id': ObjectId(staff_id)})
+    class_obj = classes.get(class_id)
+    staff = users.get(staff_id)
     
     if not class_obj:
         return jsonify({
@@ -254,16 +584,14 @@ def assign_class_advisor():
             'message': 'Class not found'
         }), 404
     
-    if not staff or staff['role'] != 'staff':
+    if not staff or staff.role != 'staff':
         return jsonify({
             'success': False,
             'message': 'Selected user is not a staff member'
         }), 400
     
-    db.classes.update_one(
-        {'_id': ObjectId(class_id)},
-        {'$set': {'class_advisor_id': staff_id}}
-    )
+    classes.set_advisor(class_id, staff_id)
+    invalidate_department(class_obj.department)
     
     return jsonify({
         'success': True,
@@ -278,42 +606,59 @@ def assign_subject():
     subject_id = data.get('subject_id')
     class_id = data.get('class_id')
     
-    db = get_db()
-    
     # Check if assignment already exists
-    existing = db.staff_subjects.find_one({
-        'staff_id': staff_id,
-        'subject_id': subject_id,
-        'class_id': class_id
-    })
-    
-    if existing:
+    if staff_subjects.exists(staff_id, subject_id, class_id):
         return jsonify({
             'success': False,
             'message': 'Assignment already exists'
         }), 400
     
-    assignment_data = {
-        'staff_id': staff_id,
-        'subject_id': subject_id,
-        'class_id': class_id,
-        'created_at': datetime.utcnow()
-    }
-    
-    db.staff_subjects.insert_one(assignment_data)
+    staff_subjects.insert(staff_id, subject_id, class_id)
+    invalidate_department(get_current_user().department)
     
     return jsonify({
         'success': True,
         'message': 'Subject assigned successfully'
     })
 
+def _class_reference(class_id):
+    # The class and the reference data of its department
+    reference = get_reference_data(get_current_user().department)
+    class_obj = get_class(reference, class_id)
+    if class_obj and class_obj.department != get_current_user().department:
+        reference = get_reference_data(class_obj.department)
+    return class_obj, reference
+
+@hod_bp.route('/api/class-matrix/<class_id>')
+@hod_required
+@conditional(department_scopes(reference_scope, progress_scope))
+async def get_class_matrix(class_id):
+    # ?semester= picks another semester's subjects; defaults to the class's
+    semester = request.args.get('semester', type=int)
+    try:
+        class_obj, reference = _class_reference(class_id)
+    except InvalidId:
+        class_obj = None
+    if not class_obj:
+        return jsonify({
+            'success': False,
+            'message': 'Class not found'
+        }), 404
+    
+    matrix = await load_class_matrix(class_obj, reference, semester)
+    return jsonify({
+        'class_id': class_obj.id,
+        'semester': class_obj.semester if semester is None else semester,
+        **matrix.to_json()
+    })
+
 @hod_bp.route('/api/class-statistics/<class_id>')
 @hod_required
-def get_class_statistics(class_id):
+@conditional(department_scopes(reference_scope, progress_scope))
+async def get_class_statistics(class_id):
     try:
-        db = get_db()
         # Get class info
-        class_obj = db.classes.find_one({'_id': ObjectId(class_id)})
+        class_obj, reference = _class_reference(class_id)
         
         if not class_obj:
             return jsonify({
@@ -322,48 +667,17 @@ def get_class_statistics(class_id):
                 'pending_dues': 0
             })
         
-        # Get all students in this class
-        students = list(db.users.find({
-            'role': 'student',
-            'department': class_obj['department'],
-            'year': class_obj['year'],
-            'semester': class_obj['semester'],
-            'class_section': class_obj['section']
-        }))
-        
-        total_students = len(students)
-        completed_dues = 0
-        pending_dues = 0
-        
-        # Get subjects for this class
-        subjects = list(db.subjects.find({
-            'department': class_obj['department'],
-            'semester': class_obj['semester']
-        }))
-        
-        for student in students:
-            # Check if all subjects are approved for this student
-            all_approved = True
-            for subject in subjects:
-                status = db.no_due_status.find_one({
-                    'student_id': str(student['_id']),
-                    'subject_id': str(subject['_id'])
-                })
-                if not status or status['status'] != 'approved':
-                    all_approved = False
-                    break
-            
-            if all_approved and len(subjects) > 0:
-                completed_dues += 1
-            else:
-                pending_dues += 1
+        matrix = await load_class_matrix(class_obj, reference)
+        total_students = len(matrix.students)
+        completed_dues = matrix.cleared_students()
+        pending_dues = total_students - completed_dues
         
         return jsonify({
             'total_students': total_students,
             'completed_dues': completed_dues,
             'pending_dues': pending_dues
         })
-        
+    
     except Exception as e:
         return jsonify({
             'total_students': 0,
@@ -371,12 +685,20 @@ def get_class_statistics(class_id):
             'pending_dues': 0
         })
 
+def _with_missing_clearances(students, clearances):
+    # Summaries not built yet (or filed under another class) go through the
+    # synchronous path, which creates them
+    missing = [student for student in students if student.id not in clearances]
+    if missing:
+        clearances.update(get_clearances(missing))
+    return clearances
+
 @hod_bp.route('/api/subject-statistics/<subject_id>')
 @hod_required
+@conditional(department_scopes(reference_scope, progress_scope))
 def get_subject_statistics(subject_id):
     try:
-        db = get_db()
-        subject = db.subjects.find_one({'_id': ObjectId(subject_id)})
+        subject = subjects.get(subject_id)
         
         if not subject:
             return jsonify({
@@ -385,187 +707,178 @@ def get_subject_statistics(subject_id):
             })
         
         # Get all students for this subject's department and semester
-        students = list(db.users.find({
-            'role': 'student',
-            'department': subject['department'],
-            'semester': subject['semester']
-        }))
-        
-        completed = 0
-        pending = 0
-        
-        for student in students:
-            status = db.no_due_status.find_one({
-                'student_id': str(student['_id']),
-                'subject_id': subject_id
-            })
-            
-            if status and status['status'] == 'approved':
-                completed += 1
-            else:
-                pending += 1
+        student_ids = set(users.find_student_ids(subject.department, subject.semester))
+        approved = no_due_status.approved_students_by_subject([subject_id]).get(subject_id, set())
+        completed = len(student_ids & approved)
         
         return jsonify({
             'completed': completed,
-            'pending': pending
+            'pending': len(student_ids) - completed
         })
-        
+    
     except Exception as e:
         return jsonify({
             'completed': 0,
             'pending': 0
         })
 
+@hod_bp.route('/api/subjects/statistics')
+@hod_required
+@conditional(department_scopes(reference_scope, progress_scope))
+def get_all_subject_statistics():
+    hod = get_current_user()
+    department_subjects = list(get_reference_data(hod.department)['subjects'].values())
+    
+    # Student ids per semester for the department
+    semester_students = {}
+    for student in users.find_students(hod.department):
+        semester_students.setdefault(student.semester, set()).add(student.id)
+    
+    # Approving students per subject
+    approved = no_due_status.approved_students_by_subject([subject.id for subject in department_subjects])
+    
+    statistics = {}
+    for subject in department_subjects:
+        students = semester_students.get(subject.semester, set())
+        completed = len(students & approved.get(subject.id, set()))
+        statistics[subject.id] = {
+            'completed': completed,
+            'pending': len(students) - completed
+        }
+    
+    return jsonify(statistics)
+
 @hod_bp.route('/api/class-students/<class_id>')
 @hod_required
-def get_class_students(class_id):
+@conditional(department_scopes(reference_scope, progress_scope))
+async def get_class_students(class_id):
     try:
-        db = get_db()
+        limit, after = page_args()
+        final_status = request.args.get('final_status')
+        has_pending = bool_arg('has_pending')
+        
         # Get class info
-        class_obj = db.classes.find_one({'_id': ObjectId(class_id)})
+        class_obj = await run_async(analytics.get_class(class_id))
         
         if not class_obj:
             return jsonify([])
         
-        # Get all students in this class
-        students = list(db.users.find({
-            'role': 'student',
-            'department': class_obj['department'],
-            'year': class_obj['year'],
-            'semester': class_obj['semester'],
-            'class_section': class_obj['section']
-        }))
+        # Every student of a class shares its semester subjects
+        semester_subjects_task = asyncio.ensure_future(
+            run_async(analytics.find_subjects(class_obj.department, class_obj.semester))
+        )
+        try:
+            # Walk the class in chunks until a page of matching students is found
+            page = []
+            while len(page) <= limit:
+                chunk = await run_async(analytics.find_class_students(class_obj, after=after, limit=limit + 1))
+                if not chunk:
+                    break
+                clearances = _with_missing_clearances(chunk, await run_async(
+                    analytics.find_clearances((student.id for student in chunk), current_term())
+                ))
+                for student in chunk:
+                    clearance = clearances[student.id]
+                    if final_status and (clearance.final_status or 'not_requested') != final_status:
+                        continue
+                    if has_pending is not None and (clearance.approved_count < clearance.total_count) != has_pending:
+                        continue
+                    page.append((student, clearance))
+                if len(chunk) <= limit:
+                    break
+                after = ObjectId(chunk[-1].id)
+            page = page[:limit + 1]
+            semester_subjects = await semester_subjects_task
+        finally:
+            # Not left running when the page walk fails
+            semester_subjects_task.cancel()
+        
+        # Teacher notes for the whole page come from one status query. Names
+        # are stored on the statuses; only older records need a name query.
+        remarks = await run_async(analytics.find_remarks(
+            [student.id for student, _ in page], [subject.id for subject in semester_subjects], current_term()
+        ))
+        teacher_names = {status.approved_by: status.approved_by_name for status in remarks if status.approved_by_name}
+        unnamed = {status.approved_by for status in remarks if status.approved_by and status.approved_by not in teacher_names}
+        if unnamed:
+            teacher_names.update(await run_async(analytics.names(unnamed)))
+        notes = {(status.student_id, status.subject_id): status for status in remarks}
         
         students_data = []
-        for student in students:
-            # Get subject approval count
-            total_subjects = db.subjects.count_documents({
-                'department': student['department'],
-                'semester': student['semester']
-            })
-            
-            approved_subjects = db.no_due_status.count_documents({
-                'student_id': str(student['_id']),
-                'status': 'approved'
-            })
-            
-            # Get final approval status
-            final_approval = db.final_approvals.find_one({'student_id': str(student['_id'])})
-            
-            # Get teacher notes/remarks for this student
+        for student, clearance in page:
             teacher_notes = []
-            subjects = list(db.subjects.find({
-                'department': student['department'],
-                'semester': student['semester']
-            }))
-            
-            for subject in subjects:
-                status = db.no_due_status.find_one({
-                    'student_id': str(student['_id']),
-                    'subject_id': str(subject['_id'])
-                })
-                
-                if status and status.get('remarks'):
-                    teacher = db.users.find_one({'_id': ObjectId(status['approved_by'])}) if status.get('approved_by') else None
+            for subject in semester_subjects:
+                status = notes.get((student.id, subject.id))
+                if status:
                     teacher_notes.append({
-                        'subject': subject['name'],
-                        'remarks': status['remarks'],
-                        'teacher_name': teacher['name'] if teacher else None
+                        'subject': subject.name,
+                        'remarks': status.remarks,
+                        'teacher_name': teacher_names.get(status.approved_by) if status.approved_by else None
                     })
             
             students_data.append({
-                'id': str(student['_id']),
-                'name': student['name'],
-                'roll_number': student['roll_number'],
-                'approved_subjects': approved_subjects,
-                'total_subjects': total_subjects,
-                'final_status': final_approval['status'] if final_approval else 'not_requested',
-                'final_remarks': final_approval['remarks'] if final_approval else None,
+                'id': student.id,
+                'name': student.name,
+                'roll_number': student.roll_number,
+                'approved_subjects': clearance.approved_count,
+                'total_subjects': clearance.total_count,
+                'final_status': clearance.final_status or 'not_requested',
+                'final_remarks': clearance.final_remarks,
                 'teacher_notes': teacher_notes
             })
         
-        return jsonify(students_data)
-        
+        return paginated_response(students_data, limit)
+    
     except Exception as e:
         return jsonify([])
 
 @hod_bp.route('/api/class-subjects/<class_id>/<int:semester>')
 @hod_required
-def get_class_subjects(class_id, semester):
+@conditional(department_scopes(reference_scope, progress_scope))
+async def get_class_subjects(class_id, semester):
     try:
-        db = get_db()
         # Get class info
-        class_obj = db.classes.find_one({'_id': ObjectId(class_id)})
+        class_obj, reference = _class_reference(class_id)
         
         if not class_obj:
             return jsonify([])
         
-        # Get all subjects for this semester and department
-        subjects = list(db.subjects.find({
-            'department': class_obj['department'],
-            'semester': semester
-        }))
+        matrix = await load_class_matrix(class_obj, reference, semester)
         
         subjects_data = []
-        for subject in subjects:
-            # Get all students for this class
-            students = list(db.users.find({
-                'role': 'student',
-                'department': class_obj['department'],
-                'year': class_obj['year'],
-                'semester': class_obj['semester'],
-                'class_section': class_obj['section']
-            }))
-            
-            completed = 0
-            pending = 0
-            
-            for student in students:
-                status = db.no_due_status.find_one({
-                    'student_id': str(student['_id']),
-                    'subject_id': str(subject['_id'])
-                })
-                
-                if status and status['status'] == 'approved':
-                    completed += 1
-                else:
-                    pending += 1
-            
+        for subject, completed, pending in zip(matrix.subjects, matrix.completed(), matrix.pending()):
             subjects_data.append({
-                'id': str(subject['_id']),
-                'name': subject['name'],
-                'code': subject['code'],
-                'credits': subject['credits'],
+                'id': subject.id,
+                'name': subject.name,
+                'code': subject.code,
+                'credits': subject.credits,
                 'completed': completed,
                 'pending': pending
             })
         
         return jsonify(subjects_data)
-        
+    
     except Exception as e:
         return jsonify([])
 
 @hod_bp.route('/api/class-subject-count/<class_id>/<int:semester>')
 @hod_required
+@conditional(department_scopes(reference_scope))
 def get_class_subject_count(class_id, semester):
     try:
-        db = get_db()
         # Get class info
-        class_obj = db.classes.find_one({'_id': ObjectId(class_id)})
+        class_obj = classes.get(class_id)
         
         if not class_obj:
             return jsonify({'subject_count': 0})
         
         # Count subjects for this semester and department
-        subject_count = db.subjects.count_documents({
-            'department': class_obj['department'],
-            'semester': semester
-        })
+        subject_count = subjects.count(class_obj.department, semester)
         
         return jsonify({
             'subject_count': subject_count
         })
-        
+    
     except Exception as e:
         return jsonify({
             'subject_count': 0
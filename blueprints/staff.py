@@ -1,6 +1,11 @@
 from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for
-from database import get_db
-from bson import ObjectId
+from clearance import record_subject_statuses
+from current_user import get_current_user
+from events import event_stream, push_enabled, publish_subject_statuses
+from etags import conditional, department_scopes, bump, progress_scope, reference_scope, student_scope, subject_scope
+from pagination import page_args, chunks, paginated_response
+from reference_data import get_reference_data, get_subject, get_class
+from repositories import no_due_status, subjects, users
 from datetime import datetime
 from functools import wraps
 
@@ -14,69 +19,97 @@ def staff_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def _subject_scopes(subject_id, class_section):
+    return [reference_scope(get_current_user().department), subject_scope(subject_id)]
+
 @staff_bp.route('/dashboard')
 @staff_required
 def dashboard():
-    return render_template('staff_dashboard.html')
+    return render_template('staff_dashboard.html', events_push=push_enabled())
 
 @staff_bp.route('/api/assigned-subjects')
 @staff_required
+@conditional(department_scopes(reference_scope))
 def get_assigned_subjects():
-    db = get_db()
     staff_id = session['user_id']
+    reference = get_reference_data(get_current_user().department)
     
     # Get staff assignments
-    assignments = list(db.staff_subjects.find({'staff_id': staff_id}))
+    assignments = reference['assignments'].get(staff_id, [])
     
     subjects_data = []
     for assignment in assignments:
-        subject = db.subjects.find_one({'_id': ObjectId(assignment['subject_id'])})
-        assigned_class = db.classes.find_one({'_id': ObjectId(assignment['class_id'])})
+        subject = get_subject(reference, assignment.subject_id)
+        assigned_class = get_class(reference, assignment.class_id)
         
         if subject and assigned_class:
             subjects_data.append({
-                'id': str(subject['_id']),
-                'name': subject['name'],
-                'class_section': assigned_class['section'],
-                'department': subject['department'],
-                'semester': subject['semester']
+                'id': subject.id,
+                'name': subject.name,
+                'class_section': assigned_class.section,
+                'department': subject.department,
+                'semester': subject.semester
             })
     
     return jsonify(subjects_data)
 
 @staff_bp.route('/api/students/<subject_id>/<class_section>')
 @staff_required
+@conditional(_subject_scopes)
 def get_students_for_subject(subject_id, class_section):
-    db = get_db()
-    subject = db.subjects.find_one({'_id': ObjectId(subject_id)})
+    subject = subjects.get(subject_id)
     
     if not subject:
         return jsonify([]), 404
     
-    students = list(db.users.find({
-        'role': 'student',
-        'department': subject['department'],
-        'semester': subject['semester'],
-        'class_section': class_section
-    }))
+    limit, after = page_args()
+    status_filter = request.args.get('status')  # pending, approved or rejected
+    
+    students = users.find_students(subject.department, semester=subject.semester, class_section=class_section,
+                                   after=after, limit=None if status_filter else limit + 1)
     
     students_data = []
-    for student in students:
-        status = db.no_due_status.find_one({
-            'student_id': str(student['_id']),
-            'subject_id': subject_id
-        })
-        
-        students_data.append({
-            'id': str(student['_id']),
-            'name': student['name'],
-            'roll_number': student['roll_number'],
-            'status': status['status'] if status else 'pending',
-            'remarks': status['remarks'] if status else None,
-            'updated_at': status['updated_at'].strftime('%Y-%m-%d %H:%M') if status and status.get('updated_at') else None
-        })
-    
-    return jsonify(students_data)
+    for chunk in chunks(students, limit + 1):
+        # One status query per chunk instead of one per student
+        statuses = no_due_status.find_for_subject(subject_id, [student.id for student in chunk])
+        for student in chunk:
+            status = statuses.get(student.id)
+            if status_filter and (status.status if status else 'pending') != status_filter:
+                continue
+            students_data.append(_student_row(student, status))
+        if len(students_data) > limit:
+            break
+    
+    return paginated_response(students_data, limit)
+
+@staff_bp.route('/api/student-counts/<subject_id>/<class_section>')
+@staff_required
+@conditional(_subject_scopes)
+def get_student_counts(subject_id, class_section):
+    # Totals for the whole class, independent of how many pages are loaded
+    subject = subjects.get(subject_id)
+    
+    if not subject:
+        return jsonify({}), 404
+    
+    student_ids = users.find_student_ids(subject.department, semester=subject.semester, class_section=class_section)
+    counts = no_due_status.status_counts(subject_id, student_ids)
+    return jsonify({
+        'total': len(student_ids),
+        'approved': counts.get('approved', 0),
+        'rejected': counts.get('rejected', 0),
+        'pending': len(student_ids) - counts.get('approved', 0) - counts.get('rejected', 0)
+    })
+
+def _student_row(student, status):
+    return {
+        'id': student.id,
+        'name': student.name,
+        'roll_number': student.roll_number,
+        'status': status.status if status else 'pending',
+        'remarks': status.remarks if status else None,
+        'updated_at': status.updated_at.strftime('%Y-%m-%d %H:%M') if status and status.updated_at else None
+    }
 
 @staff_bp.route('/api/approve-student', methods=['POST'])
 @staff_required
@@ -87,33 +120,115 @@ def approve_student():
     action = data.get('action')  # approve or reject
     remarks = data.get('remarks', '')
     
-    db = get_db()
+    staff = get_current_user()
+    errors = no_due_status.record_decisions([(student_id, subject_id, action, remarks)], session['user_id'], staff.name)
+    if errors:
+        return jsonify({
+            'success': False,
+            'message': errors[0]
+        }), 409
+    record_subject_statuses([(student_id, subject_id, action == 'approve')])
+    department = staff.department
+    bump(subject_scope(subject_id), student_scope(student_id), progress_scope(department))
+    publish_subject_statuses(department, [_status_event(student_id, subject_id, action, remarks)])
     
-    # Check if status already exists
-    status = db.no_due_status.find_one({
-        'student_id': student_id,
-        'subject_id': subject_id
+    return jsonify({
+        'success': True,
+        'message': f'Student {action}d successfully'
     })
+
+@staff_bp.route('/api/approve-students', methods=['POST'])
+@staff_required
+def approve_students():
+    data = request.get_json()
+    
+    items = list(data.get('items') or [])
+    
+    # Expand "approve all pending in this section" into explicit items
+    if data.get('all_pending'):
+        subject_id = data.get('subject_id')
+        class_section = data.get('class_section')
+        if not isinstance(class_section, str) or not class_section:
+            # Without a section this would decide for the whole semester
+            return jsonify({
+                'success': False,
+                'message': 'class_section is required with all_pending'
+            }), 400
+        subject = subjects.get(subject_id)
+        if not subject:
+            return jsonify({
+                'success': False,
+                'message': 'Subject not found'
+            }), 404
+        
+        student_ids = users.find_student_ids(subject.department, subject.semester, class_section)
+        decided = no_due_status.decided_student_ids(subject_id, student_ids)
+        items.extend({
+            'student_id': student_id,
+            'subject_id': subject_id,
+            'action': data.get('action', 'approve'),
+            'remarks': data.get('remarks', '')
+        } for student_id in student_ids if student_id not in decided)
+    
+    results = []
+    decisions = []
+    positions = []
+    for item in items:
+        if not isinstance(item, dict):
+            results.append({'student_id': None, 'subject_id': None, 'action': None,
+                            'success': False, 'message': 'Each item must be an object'})
+            continue
+        result = {
+            'student_id': item.get('student_id'),
+            'subject_id': item.get('subject_id'),
+            'action': item.get('action')
+        }
+        if not result['student_id'] or not result['subject_id']:
+            result.update(success=False, message='student_id and subject_id are required')
+        elif result['action'] not in ('approve', 'reject'):
+            result.update(success=False, message='action must be approve or reject')
+        else:
+            result.update(success=True, message=f"Student {result['action']}d successfully")
+            decisions.append((result['student_id'], result['subject_id'], result['action'], item.get('remarks', '')))
+            positions.append(len(results))
+        results.append(result)
     
-    status_data = {
+    errors = no_due_status.record_decisions(decisions, session['user_id'], get_current_user().name)
+    for index, message in errors.items():
+        results[positions[index]].update(success=False, message=message)
+    
+    applied = [decision for index, decision in enumerate(decisions) if index not in errors]
+    record_subject_statuses([
+        (student_id, subject_id, action == 'approve')
+        for student_id, subject_id, action, _ in applied
+    ])
+    if applied:
+        department = get_current_user().department
+        bump(progress_scope(department),
+             *{subject_scope(subject_id) for _, subject_id, _, _ in applied},
+             *{student_scope(student_id) for student_id, _, _, _ in applied})
+        publish_subject_statuses(department, [_status_event(*decision) for decision in applied])
+    
+    succeeded = sum(1 for result in results if result['success'])
+    return jsonify({
+        'success': succeeded == len(results),
+        'message': f'{succeeded} of {len(results)} students updated',
+        'results': results
+    })
+
+def _status_event(student_id, subject_id, action, remarks):
+    return {
         'student_id': student_id,
         'subject_id': subject_id,
         'status': 'approved' if action == 'approve' else 'rejected',
-        'approved_by': session['user_id'],
         'remarks': remarks,
         'updated_at': datetime.utcnow()
     }
-    
-    if status:
-        db.no_due_status.update_one(
-            {'_id': status['_id']},
-            {'$set': status_data}
-        )
-    else:
-        status_data['created_at'] = datetime.utcnow()
-        db.no_due_status.insert_one(status_data)
-    
-    return jsonify({
-        'success': True,
-        'message': f'Student {action}d successfully'
-    })
+
+@staff_bp.route('/api/events')
+@staff_required
+def events():
+    # Status changes of every subject assigned to the logged-in staff member
+    reference = get_reference_data(get_current_user().department)
+    assignments = reference['assignments'].get(session['user_id'], [])
+    return event_stream(f'subject:{assignment.subject_id}' for assignment in assignments)
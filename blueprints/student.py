@@ -1,7 +1,9 @@
 from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for
-from database import get_db
-from bson import ObjectId
-from datetime import datetime
+from current_user import get_current_user
+from events import event_stream, push_enabled, publish_progress
+from etags import conditional, bump, progress_scope, reference_scope, student_scope
+from clearance import get_clearance, record_final_status
+from repositories import final_approvals, no_due_status, subjects
 from functools import wraps
 
 student_bp = Blueprint('student', __name__)
@@ -14,96 +16,76 @@ def student_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def _student_scopes(**kwargs):
+    user = get_current_user()
+    return [reference_scope(user.department), student_scope(user.id)]
+
 @student_bp.route('/dashboard')
 @student_required
 def dashboard():
-    return render_template('student_dashboard.html')
+    return render_template('student_dashboard.html', events_push=push_enabled())
 
 @student_bp.route('/api/subjects')
 @student_required
+@conditional(_student_scopes)
 def get_subjects():
-    db = get_db()
-    user = db.users.find_one({'_id': ObjectId(session['user_id'])})
+    user = get_current_user()
     
-    subjects = list(db.subjects.find({
-        'department': user['department'],
-        'semester': user['semester']
-    }))
+    semester_subjects = subjects.find(user.department, user.semester)
+    statuses = no_due_status.find_for_student(user.id, [subject.id for subject in semester_subjects])
     
     subject_data = []
-    for subject in subjects:
-        status = db.no_due_status.find_one({
-            'student_id': str(user['_id']),
-            'subject_id': str(subject['_id'])
-        })
+    for subject in semester_subjects:
+        status = statuses.get(subject.id)
         
         subject_data.append({
-            'id': str(subject['_id']),
-            'name': subject['name'],
-            'status': status['status'] if status else 'pending',
-            'remarks': status['remarks'] if status else None,
-            'updated_at': status['updated_at'].strftime('%Y-%m-%d %H:%M') if status and status.get('updated_at') else None
+            'id': subject.id,
+            'name': subject.name,
+            'status': status.status if status else 'pending',
+            'remarks': status.remarks if status else None,
+            'updated_at': status.updated_at.strftime('%Y-%m-%d %H:%M') if status and status.updated_at else None
         })
     
     return jsonify(subject_data)
 
 @student_bp.route('/api/final-approval-status')
 @student_required
+@conditional(_student_scopes)
 def get_final_approval_status():
-    db = get_db()
-    user = db.users.find_one({'_id': ObjectId(session['user_id'])})
-    final_approval = db.final_approvals.find_one({'student_id': str(user['_id'])})
-    
-    # Check if all subjects are approved
-    subjects = list(db.subjects.find({
-        'department': user['department'],
-        'semester': user['semester']
-    }))
-    
-    all_approved = True
-    for subject in subjects:
-        status = db.no_due_status.find_one({
-            'student_id': str(user['_id']),
-            'subject_id': str(subject['_id'])
-        })
-        if not status or status['status'] != 'approved':
-            all_approved = False
-            break
+    user = get_current_user()
+    clearance = get_clearance(user)
     
     return jsonify({
-        'can_request': all_approved and not final_approval,
-        'status': final_approval['status'] if final_approval else None,
-        'remarks': final_approval['remarks'] if final_approval else None,
-        'updated_at': final_approval['updated_at'].strftime('%Y-%m-%d %H:%M') if final_approval and final_approval.get('updated_at') else None
+        'can_request': clearance.all_approved and not clearance.final_status,
+        'status': clearance.final_status,
+        'remarks': clearance.final_remarks,
+        'updated_at': clearance.final_updated_at.strftime('%Y-%m-%d %H:%M') if clearance.final_updated_at else None
     })
 
 @student_bp.route('/api/request-final-approval', methods=['POST'])
 @student_required
 def request_final_approval():
-    db = get_db()
-    user = db.users.find_one({'_id': ObjectId(session['user_id'])})
+    user = get_current_user()
     
     # Check if already requested
-    existing = db.final_approvals.find_one({'student_id': str(user['_id'])})
-    if existing:
+    if final_approvals.get_for_student(user.id):
         return jsonify({
             'success': False,
             'message': 'Final approval already requested'
         }), 400
     
     # Create final approval request
-    final_approval_data = {
-        'student_id': str(user['_id']),
-        'status': 'pending',
-        'approved_by': None,
-        'remarks': None,
-        'created_at': datetime.utcnow(),
-        'updated_at': datetime.utcnow()
-    }
-    
-    db.final_approvals.insert_one(final_approval_data)
+    requested_at = final_approvals.request(user.id)
+    record_final_status(user.id, 'pending', None, requested_at)
+    bump(student_scope(user.id), progress_scope(user.department))
+    publish_progress(user.department, [user.id])
     
     return jsonify({
         'success': True,
         'message': 'Final approval requested successfully'
     })
+
+@student_bp.route('/api/events')
+@student_required
+def events():
+    return event_stream([f'student:{session["user_id"]}'])
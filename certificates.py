@@ -0,0 +1,357 @@
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import tempfile
+import textwrap
+import threading
+import time
+import uuid
+import zipfile
+import zlib
+import click
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from flask import current_app
+from flask.cli import with_appcontext
+from reference_data import semester_subjects
+from repositories import certificate_jobs, final_approvals, users
+from terms import current_term
+
+# No-due certificates for students whose final approval is approved.
+#
+# A certificate is a one-page PDF built from a small dict of its contents.
+# The SHA-256 of that dict names the file in CERTIFICATE_DIR, so a
+# certificate is only rendered again when something printed on it changes.
+# A batch (a class or a whole department) renders the missing files on a
+# per-process pool of CERTIFICATE_WORKERS processes from a background
+# thread, records its progress in `certificate_jobs` and ends with a zip
+# named after the hashes it contains, which is reused the same way.
+#
+# Without a pool (CERTIFICATE_WORKERS=0) or without BACKGROUND_JOBS, as on
+# serverless platforms that freeze the function once it has responded, the
+# batch is rendered within the request instead, and batches of more than
+# CERTIFICATE_INLINE_LIMIT certificates are refused (one page renders in
+# well under a millisecond, so the default of 500 fits a request easily).
+#
+# Files live on the local disk of the host that rendered them, so a
+# deployment with several hosts must either route a job's download to the
+# host that created it or point CERTIFICATE_DIR at shared storage; a
+# download that lands elsewhere gets 410 and must be generated again.
+# Every use of a file refreshes its mtime, and files unused for
+# CERTIFICATE_FILE_TTL seconds (at least the job lifetime, a day) are
+# deleted: by each process at most once per PRUNE_INTERVAL when it starts
+# a job, or on demand with `flask prune-certificates`.
+
+# Bump when the layout changes, so cached files are not served any more
+TEMPLATE_VERSION = 1
+BATCH_SIZE = 500
+PROGRESS_INTERVAL = 0.5
+PRUNE_INTERVAL = 3600
+
+# --- PDF rendering. Runs in the pool's processes, so it only takes plain data.
+
+_PAGE_WIDTH, _PAGE_HEIGHT = 595, 842    # A4 in points
+
+def _pdf_text(value):
+    text = str(value).encode('cp1252', 'replace').decode('latin-1')
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def _pdf(operations):
+    # operations: ('text', font, size, x, y, text) or ('line', x1, y1, x2, y2)
+    content = []
+    for op in operations:
+        if op[0] == 'text':
+            _, font, size, x, y, text = op
+            content.append(f'BT /{font} {size} Tf {x} {y} Td ({_pdf_text(text)}) Tj ET')
+        else:
+            _, x1, y1, x2, y2 = op
+            content.append(f'{x1} {y1} m {x2} {y2} l S')
+    stream = zlib.compress('\n'.join(content).encode('latin-1'))
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        (f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_PAGE_WIDTH} {_PAGE_HEIGHT}] '
+         '/Resources << /Font << /F1 5 0 R /F2 6 0 R >> >> /Contents 4 0 R >>').encode('ascii'),
+        b'<< /Length %d /Filter /FlateDecode >>\nstream\n' % len(stream) + stream + b'\nendstream',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+    ]
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n' % number + body + b'\nendobj\n'
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    out += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
+
+def render_certificate(data, key):
+    left = 72
+    ops = [
+        ('text', 'F2', 22, left, 760, 'NO DUE CERTIFICATE'),
+        ('text', 'F1', 12, left, 736, f"Department of {data['department']}"),
+        ('line', left, 724, _PAGE_WIDTH - left, 724),
+    ]
+    y = 696
+    statement = (f"This is to certify that {data['name']} (Roll No. {data['roll_number'] or '-'}), "
+                 f"year {data['year']}, semester {data['semester']}, section {data['class_section']}, "
+                 f"has no dues pending with the department"
+                 + (f" for the term {data['term']}." if data['term'] else '.'))
+    for line in textwrap.wrap(statement, 80):
+        ops.append(('text', 'F1', 12, left, y, line))
+        y -= 18
+
+    y -= 14
+    ops.append(('text', 'F2', 11, left, y, 'Code'))
+    ops.append(('text', 'F2', 11, left + 90, y, 'Subject'))
+    ops.append(('text', 'F2', 11, left + 380, y, 'Status'))
+    y -= 6
+    ops.append(('line', left, y, _PAGE_WIDTH - left, y))
+    for code, name in data['subjects']:
+        y -= 16
+        ops.append(('text', 'F1', 11, left, y, code or ''))
+        ops.append(('text', 'F1', 11, left + 90, y, textwrap.shorten(name or '', 50)))
+        ops.append(('text', 'F1', 11, left + 380, y, 'Cleared'))
+
+    y -= 36
+    ops.append(('text', 'F1', 12, left, y, f"Final approval granted on {data['approved_on']}"))
+    if data['remarks']:
+        y -= 18
+        ops.append(('text', 'F1', 12, left, y, textwrap.shorten(f"Remarks: {data['remarks']}", 80)))
+
+    ops += [
+        ('line', 380, 130, _PAGE_WIDTH - left, 130),
+        ('text', 'F1', 11, 400, 114, 'Head of the Department'),
+        ('text', 'F1', 8, left, 60, f'Certificate {key[:16]}'),
+    ]
+    return _pdf(ops)
+
+def _write_atomic(path, write):
+    # Readers never see a half-written file; concurrent writers just race
+    tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def _render_to_file(path, data, key):
+    def write(tmp):
+        with open(tmp, 'wb') as f:
+            f.write(render_certificate(data, key))
+    _write_atomic(path, write)
+    return path
+
+# --- Process pool
+
+class CertificatePool:
+    def __init__(self, workers):
+        self.workers = workers
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def executor(self):
+        # None renders in the calling thread; platforms without working
+        # multiprocessing primitives (serverless) run with 0 workers.
+        if not self.workers:
+            return None
+        # A forked worker cannot use its parent's pool
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    # spawn: children must not inherit the Mongo client's threads and sockets
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                         mp_context=multiprocessing.get_context('spawn'))
+                    self._pid = os.getpid()
+        return self._executor
+
+def _pool():
+    pool = current_app.extensions.get('certificate_pool')
+    if pool is None:
+        pool = current_app.extensions.setdefault('certificate_pool', CertificatePool(
+            current_app.config.get('CERTIFICATE_WORKERS', 2)
+        ))
+    return pool
+
+def certificate_dir():
+    path = current_app.config.get('CERTIFICATE_DIR') or os.path.join(tempfile.gettempdir(), 'no-due-certificates')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def _touch(path):
+    # Marks a cached file as used; False when it does not exist
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def prune_files(directory, max_age):
+    # Deletes certificates, archives and leftover temporary files unused for
+    # `max_age` seconds; returns how many were removed
+    cutoff = time.time() - max_age
+    removed = 0
+    for entry in os.scandir(directory):
+        if not entry.name.endswith(('.pdf', '.zip', '.tmp')):
+            continue
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
+
+_last_prune = 0
+
+def _maybe_prune(directory):
+    global _last_prune
+    if time.monotonic() - _last_prune < PRUNE_INTERVAL:
+        return
+    _last_prune = time.monotonic()
+    try:
+        prune_files(directory, current_app.config.get('CERTIFICATE_FILE_TTL', 86400))
+    except OSError:
+        current_app.logger.exception('Pruning %s failed', directory)
+
+# --- Batches
+
+def certificate_key(data):
+    payload = json.dumps([TEMPLATE_VERSION, data], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _file_name(data):
+    name = f"{data['roll_number'] or data['student_id']}-{data['name'] or ''}"
+    return re.sub(r'[^A-Za-z0-9]+', '-', name).strip('-') + '.pdf'
+
+def certificate_data(student, approval, reference):
+    subjects = sorted(semester_subjects(reference, student.semester), key=lambda subject: subject.code or '')
+    return {
+        'student_id': student.id,
+        'name': student.name,
+        'roll_number': student.roll_number,
+        'department': student.department,
+        'year': student.year,
+        'semester': student.semester,
+        'class_section': student.class_section,
+        'term': current_term(),
+        'subjects': [[subject.code, subject.name] for subject in subjects],
+        'approved_on': approval.updated_at.strftime('%d %B %Y') if approval.updated_at else '-',
+        'remarks': approval.remarks or ''
+    }
+
+def approved_certificates(reference, department, year=None, semester=None, class_section=None):
+    # Certificate contents for every approved student, in roll number order
+    certificates = []
+    batch = []
+
+    def flush():
+        approvals = final_approvals.find_for_students(student.id for student in batch)
+        for student in batch:
+            approval = approvals.get(student.id)
+            if approval and approval.status == 'approved':
+                certificates.append(certificate_data(student, approval, reference))
+        batch.clear()
+
+    for student in users.find_students(department, year=year, semester=semester, class_section=class_section):
+        batch.append(student)
+        if len(batch) == BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+    return sorted(certificates, key=lambda data: (data['class_section'] or '', data['roll_number'] or '',
+                                                  data['student_id']))
+
+def renders_inline():
+    # True when start_job renders in the calling request, see above
+    return not current_app.config.get('BACKGROUND_JOBS', True) or _pool().executor() is None
+
+def start_job(certificates, department, download_name):
+    # Returns the job id; rendering continues on a background thread, or
+    # is finished before returning when renders_inline()
+    directory = certificate_dir()
+    _maybe_prune(directory)
+    entries = []
+    missing = []
+    for data in certificates:
+        key = certificate_key(data)
+        path = os.path.join(directory, f'{key}.pdf')
+        entries.append((_file_name(data), key))
+        if not _touch(path):
+            missing.append((path, data, key))
+
+    archive_key = hashlib.sha256(json.dumps(entries).encode('utf-8')).hexdigest()
+    archive = f'{archive_key}.zip'
+    job_id = uuid.uuid4().hex
+    ready = _touch(os.path.join(directory, archive)) and not missing
+    certificate_jobs.create(
+        job_id,
+        department=department,
+        download_name=download_name,
+        archive=archive,
+        status='ready' if ready else 'running',
+        total=len(entries),
+        done=len(entries) - len(missing),
+        cached=len(entries) - len(missing),
+        message=None
+    )
+    if not ready and renders_inline():
+        _run_job(current_app._get_current_object(), job_id, directory, entries, missing, archive)
+    elif not ready:
+        threading.Thread(
+            target=_run_job,
+            args=(current_app._get_current_object(), job_id, directory, entries, missing, archive),
+            name='certificates',
+            daemon=True
+        ).start()
+    return job_id
+
+def _run_job(app, job_id, directory, entries, missing, archive):
+    with app.app_context():
+        try:
+            done = len(entries) - len(missing)
+            reported = time.monotonic()
+            executor = _pool().executor()
+            if executor is None:
+                completed = (_render_to_file(*task) for task in missing)
+            else:
+                completed = (future.result() for future in as_completed(
+                    [executor.submit(_render_to_file, *task) for task in missing]
+                ))
+            for _ in completed:
+                done += 1
+                if time.monotonic() - reported >= PROGRESS_INTERVAL:
+                    certificate_jobs.update(job_id, done=done)
+                    reported = time.monotonic()
+
+            def write(tmp):
+                # The PDFs are already deflated
+                with zipfile.ZipFile(tmp, 'w', zipfile.ZIP_STORED) as zf:
+                    for name, key in entries:
+                        zf.write(os.path.join(directory, f'{key}.pdf'), name)
+            _write_atomic(os.path.join(directory, archive), write)
+            certificate_jobs.update(job_id, status='ready', done=done)
+        except Exception as e:
+            app.logger.exception('Certificate job %s failed', job_id)
+            certificate_jobs.update(job_id, status='failed', message=str(e))
+
+def archive_path(job):
+    # None once the zip is gone from this host's CERTIFICATE_DIR
+    path = os.path.join(certificate_dir(), job['archive'])
+    return path if _touch(path) else None
+
+@click.command('prune-certificates')
+@click.option('--max-age', type=int, default=None,
+              help='Seconds since last use; defaults to CERTIFICATE_FILE_TTL.')
+@with_appcontext
+def prune_certificates_command(max_age):
+    if max_age is None:
+        max_age = current_app.config.get('CERTIFICATE_FILE_TTL', 86400)
+    removed = prune_files(certificate_dir(), max_age)
+    click.echo(f'Removed {removed} certificate files')
@@ -0,0 +1,72 @@
+from database import run_async
+from reference_data import semester_subjects
+from repositories import analytics
+from terms import current_term
+
+# Student x subject no-due grid for one class. Students and subjects are
+# kept as ordered id lists and the statuses as one packed string, row-major
+# by student: cell (i, j) is cells[i * len(subjects) + j] and holds the
+# index of the status in LEGEND. Building it costs two queries (students,
+# then their statuses); subjects come from the department reference data.
+
+LEGEND = ('pending', 'approved', 'rejected')
+_CODES = {status: str(index) for index, status in enumerate(LEGEND)}
+_PENDING = _CODES['pending']
+_APPROVED = _CODES['approved']
+
+class ClassMatrix:
+    __slots__ = ('students', 'subjects', 'cells')
+
+    def __init__(self, students, subjects, cells):
+        self.students = students    # [Student]
+        self.subjects = subjects    # [Subject]
+        self.cells = cells
+
+    @classmethod
+    def build(cls, students, subjects, statuses):
+        # statuses: (student_id, subject_id, status) triples
+        rows = {student.id: index for index, student in enumerate(students)}
+        columns = {subject.id: index for index, subject in enumerate(subjects)}
+        width = len(subjects)
+        cells = [_PENDING] * (len(students) * width)
+        for student_id, subject_id, status in statuses:
+            row = rows.get(student_id)
+            column = columns.get(subject_id)
+            if row is not None and column is not None:
+                cells[row * width + column] = _CODES.get(status, _PENDING)
+        return cls(students, subjects, ''.join(cells))
+
+    def completed(self):
+        # Approved students per subject, in subject order
+        width = len(self.subjects)
+        return [self.cells[column::width].count(_APPROVED) for column in range(width)]
+
+    def pending(self):
+        # Students not yet approved per subject, rejections included
+        return [len(self.students) - completed for completed in self.completed()]
+
+    def cleared_students(self):
+        # Students approved in every subject; none when there are no subjects
+        width = len(self.subjects)
+        if not width:
+            return 0
+        return sum(1 for row in range(len(self.students))
+                   if self.cells[row * width:(row + 1) * width].count(_APPROVED) == width)
+
+    def to_json(self):
+        return {
+            'students': [student.id for student in self.students],
+            'subjects': [subject.id for subject in self.subjects],
+            'legend': list(LEGEND),
+            'cells': self.cells,
+            'completed': self.completed(),
+            'pending': self.pending()
+        }
+
+async def load_class_matrix(cls, reference, semester=None):
+    subjects = semester_subjects(reference, cls.semester if semester is None else semester)
+    students = await run_async(analytics.find_class_students(cls))
+    statuses = await run_async(analytics.find_status_cells(
+        [student.id for student in students], [subject.id for subject in subjects], current_term()
+    )) if students and subjects else []
+    return ClassMatrix.build(students, subjects, statuses)
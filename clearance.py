@@ -0,0 +1,217 @@
+import click
+from datetime import datetime
+from flask.cli import with_appcontext
+from pymongo import ReplaceOne, UpdateOne
+from database import get_db
+from etags import bump, progress_scope, student_scope
+from repositories import final_approvals, no_due_status, subjects, users
+from repositories.records import Clearance
+from terms import current_term
+
+# One student_clearance document per student:
+#   student_id, department, year, semester, class_section,
+#   subject_ids           subjects of the student's department and semester
+#   approved_subject_ids  the subset with an approved no-due status
+#   approved_count, total_count, all_approved,
+#   final_status, final_remarks, final_updated_at
+# Writers keep it current with single-document updates; readers fetch it by
+# student_id instead of walking subjects and statuses.
+#
+# Readers build missing summaries from the source collections and insert
+# them with $setOnInsert. Such a summary can predate a status written while
+# it was being computed, so writers first make sure the summary exists and
+# only then apply their change to it: every change lands on whichever
+# summary won the insert.
+#
+# A summary also records the term it was computed for. Readers and writers
+# only use summaries of their current term: after `flask term start`
+# rebuilds them, workers still on the previous term (for up to
+# TERM_CACHE_TTL) neither see nor update the new ones. A summary of another
+# term is recomputed from the source collections when read, like a missing
+# one, so one that a lagging worker replaced is rebuilt on the next read.
+
+def _summarize(student, subject_ids, approved_ids, final_approval):
+    approved_subject_ids = sorted(set(subject_ids) & set(approved_ids))
+    return {
+        'student_id': student.id,
+        'department': student.department,
+        'year': student.year,
+        'semester': student.semester,
+        'class_section': student.class_section,
+        'subject_ids': sorted(subject_ids),
+        'approved_subject_ids': approved_subject_ids,
+        'approved_count': len(approved_subject_ids),
+        'total_count': len(subject_ids),
+        'all_approved': len(approved_subject_ids) == len(subject_ids),
+        'final_status': final_approval.status if final_approval else None,
+        'final_remarks': final_approval.remarks if final_approval else None,
+        'final_updated_at': final_approval.updated_at if final_approval else None,
+        'term': current_term(),
+        'updated_at': datetime.utcnow()
+    }
+
+def compute_clearances(students):
+    # Recompute summaries from source collections with a fixed number of queries
+    students = list(students)
+    student_ids = [student.id for student in students]
+
+    semester_subjects = {
+        key: subjects.find_ids(*key)
+        for key in {(student.department, student.semester) for student in students}
+    }
+    approved = no_due_status.approved_subject_ids(student_ids)
+    finals = final_approvals.find_for_students(student_ids)
+
+    return [
+        _summarize(
+            student,
+            semester_subjects[(student.department, student.semester)],
+            approved.get(student.id, []),
+            finals.get(student.id)
+        )
+        for student in students
+    ]
+
+def _current(query):
+    # Summaries of the current term; None also matches summaries without a term
+    return dict(query, term=current_term())
+
+def find_clearances(student_ids):
+    # Existing summaries of the current term only, as {student_id: Clearance}
+    return {
+        doc['student_id']: Clearance.from_doc(doc)
+        for doc in get_db().student_clearance.find(_current({'student_id': {'$in': list(student_ids)}}),
+                                                   Clearance.projection())
+    }
+
+def get_clearances(students):
+    # Returns {student_id: Clearance}; missing summaries are built on the fly
+    students = list(students)
+    clearances = find_clearances(student.id for student in students)
+
+    missing = [student for student in students if student.id not in clearances]
+    if missing:
+        summaries = compute_clearances(missing)
+        # A summary of another term is replaced; $setOnInsert never
+        # overwrites one of this term that a concurrent writer created first
+        updates = []
+        for summary in summaries:
+            updates.append(ReplaceOne({'student_id': summary['student_id'], 'term': {'$ne': summary['term']}}, summary))
+            updates.append(UpdateOne({'student_id': summary['student_id']}, {'$setOnInsert': summary}, upsert=True))
+        get_db().student_clearance.bulk_write(updates, ordered=False)
+        for summary in summaries:
+            clearances[summary['student_id']] = Clearance.from_doc(dict(summary, _id=summary['student_id']))
+
+    return clearances
+
+def _ensure_clearances(student_ids):
+    student_ids = set(student_ids)
+    existing = {doc['student_id'] for doc in get_db().student_clearance.find(
+        _current({'student_id': {'$in': list(student_ids)}}), {'_id': 0, 'student_id': 1}
+    )}
+    missing = student_ids - existing
+    if missing:
+        get_clearances(users.find_students_by_id(missing))
+
+def get_clearance(student):
+    return get_clearances([student])[student.id]
+
+def _recount():
+    return [
+        {'$set': {'approved_count': {'$size': '$approved_subject_ids'},
+                  'total_count': {'$size': '$subject_ids'}}},
+        {'$set': {'all_approved': {'$eq': ['$approved_count', '$total_count']},
+                  'updated_at': '$$NOW'}}
+    ]
+
+def _subject_status_update(student_id, subject_id, approved):
+    subject = {'$literal': [subject_id]}
+    if approved:
+        approved_subject_ids = {'$cond': [
+            {'$in': [{'$literal': subject_id}, '$subject_ids']},
+            {'$setUnion': ['$approved_subject_ids', subject]},
+            '$approved_subject_ids'
+        ]}
+    else:
+        approved_subject_ids = {'$setDifference': ['$approved_subject_ids', subject]}
+
+    return UpdateOne(
+        _current({'student_id': student_id}),
+        [{'$set': {'approved_subject_ids': approved_subject_ids}}] + _recount()
+    )
+
+def record_subject_status(student_id, subject_id, approved):
+    record_subject_statuses([(student_id, subject_id, approved)])
+
+def record_subject_statuses(changes):
+    # changes: iterable of (student_id, subject_id, approved)
+    changes = list(changes)
+    if changes:
+        _ensure_clearances(student_id for student_id, _, _ in changes)
+        updates = [_subject_status_update(*change) for change in changes]
+        get_db().student_clearance.bulk_write(updates, ordered=False)
+
+def record_subject_created(department, semester, subject_id):
+    get_db().student_clearance.update_many(
+        {'department': department, 'semester': semester},
+        [{'$set': {'subject_ids': {'$setUnion': ['$subject_ids', {'$literal': [subject_id]}]}}}] + _recount()
+    )
+
+def record_final_status(student_id, status, remarks, updated_at):
+    _ensure_clearances([student_id])
+    get_db().student_clearance.update_one(
+        _current({'student_id': student_id}),
+        {'$set': {
+            'final_status': status,
+            'final_remarks': remarks,
+            'final_updated_at': updated_at,
+            'updated_at': datetime.utcnow()
+        }}
+    )
+
+def record_final_statuses(student_ids, status, remarks, updated_at):
+    student_ids = list(student_ids)
+    _ensure_clearances(student_ids)
+    get_db().student_clearance.update_many(
+        _current({'student_id': {'$in': student_ids}}),
+        {'$set': {
+            'final_status': status,
+            'final_remarks': remarks,
+            'final_updated_at': updated_at,
+            'updated_at': datetime.utcnow()
+        }}
+    )
+
+def rebuild_clearances(department=None, batch_size=500):
+    # Bumps the versions of every rebuilt summary, so cached responses
+    # built from the old ones are not revalidated
+    departments = [department] if department else get_db().users.distinct('department', {'role': 'student'})
+
+    rebuilt = 0
+    for department in departments:
+        batch = []
+        for student in users.find_students(department):
+            batch.append(student)
+            if len(batch) == batch_size:
+                rebuilt += _replace_clearances(batch)
+                batch = []
+        if batch:
+            rebuilt += _replace_clearances(batch)
+        bump(progress_scope(department))
+    return rebuilt
+
+def _replace_clearances(students):
+    summaries = compute_clearances(students)
+    get_db().student_clearance.bulk_write([
+        ReplaceOne({'student_id': summary['student_id']}, summary, upsert=True)
+        for summary in summaries
+    ], ordered=False)
+    bump(*(student_scope(summary['student_id']) for summary in summaries))
+    return len(summaries)
+
+@click.command('rebuild-clearance')
+@click.option('--department', default=None, help='Only rebuild students of this department.')
+@with_appcontext
+def rebuild_clearance_command(department):
+    rebuilt = rebuild_clearances(department)
+    click.echo(f'Rebuilt clearance summaries for {rebuilt} students')
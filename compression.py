@@ -0,0 +1,60 @@
+import gzip
+from flask import request
+
+try:
+    import brotli
+except ImportError:     # gzip only
+    brotli = None
+
+# Negotiated response compression. Buffered responses of a text type and at
+# least COMPRESS_MIN_SIZE bytes are sent as br (when the brotli package is
+# installed) or gzip, whichever the client's Accept-Encoding prefers.
+# Streamed bodies (exports, event streams) and files pass through as they
+# are.
+#
+# A strong ETag promises byte-identical bodies, which no longer holds once
+# the encoding varies, so a compressed response carries the weak form of
+# its ETag. etags.conditional compares If-None-Match weakly, so a client
+# revalidates with whichever form it was sent.
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/javascript', 'text/html', 'text/css', 'text/plain', 'text/csv'
+}
+
+def compress(data, encoding, gzip_level=6, brotli_quality=4):
+    if encoding == 'br':
+        return brotli.compress(data, quality=brotli_quality)
+    # mtime=0 keeps the output stable for identical bodies
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+def init_compression(app):
+    if not app.config.get('COMPRESSION', True):
+        return
+    encodings = (['br'] if brotli is not None else []) + ['gzip']
+
+    @app.after_request
+    def compress_response(response):
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES or response.direct_passthrough or response.is_streamed:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 304)
+                or 'Content-Encoding' in response.headers):
+            return response
+
+        data = response.get_data()
+        if len(data) < app.config.get('COMPRESS_MIN_SIZE', 1024):
+            return response
+        encoding = request.accept_encodings.best_match(encodings)
+        if encoding is None:
+            return response
+
+        compressed = compress(data, encoding,
+                              app.config.get('COMPRESS_GZIP_LEVEL', 6), app.config.get('COMPRESS_BROTLI_QUALITY', 4))
+        if len(compressed) >= len(data):
+            return response
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,39 @@
+from flask import g, session, current_app
+from cache import TTLCache
+from repositories import users
+
+# Profiles are cached per process as User records, which never carry the
+# password field. Every code path that writes a users document calls
+# invalidate_user for it: login (which may rehash the password), register
+# and the roster import. Other processes pick the change up within
+# USER_CACHE_TTL.
+
+def _profile_cache():
+    cache = current_app.extensions.get('user_cache')
+    if cache is None:
+        cache = current_app.extensions['user_cache'] = TTLCache(
+            maxsize=current_app.config.get('USER_CACHE_SIZE', 2048),
+            ttl=current_app.config.get('USER_CACHE_TTL', 60)
+        )
+    return cache
+
+def load_user(user_id):
+    cache = _profile_cache()
+    user = cache.get(user_id)
+    if user is None:
+        user = users.get(user_id)
+        if user is not None:
+            cache.set(user_id, user)
+    return user
+
+def get_current_user():
+    if 'current_user' not in g:
+        user_id = session.get('user_id')
+        g.current_user = load_user(user_id) if user_id else None
+    return g.current_user
+
+def invalidate_user(user_id):
+    # Call after any write to a users document
+    _profile_cache().pop(str(user_id))
+    if g.get('current_user') is not None and g.current_user.id == str(user_id):
+        g.pop('current_user')
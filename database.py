@@ -1,27 +1,121 @@
-from pymongo import MongoClient
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from pymongo import AsyncMongoClient, MongoClient
 from flask import g, current_app
 import certifi
+from indexes import indexes_command
+
+# Config keys passed through to MongoClient when set
+POOL_OPTIONS = {
+    'MONGO_MAX_POOL_SIZE': 'maxPoolSize',
+    'MONGO_MIN_POOL_SIZE': 'minPoolSize',
+    'MONGO_MAX_IDLE_TIME_MS': 'maxIdleTimeMS',
+    'MONGO_SERVER_SELECTION_TIMEOUT_MS': 'serverSelectionTimeoutMS'
+}
+
+class MongoConnection:
+    # Owns the process's MongoClient. Nothing connects until the first
+    # get_database() call, and a process forked after that (gunicorn
+    # --preload) builds its own client instead of sharing the parent's
+    # sockets and monitor threads.
+
+    def __init__(self, app):
+        self.app = app
+        self._client = None
+        self._database = None
+        self._pid = None
+        self._async_loop = None
+        self._async_database = None
+        self._async_pid = None
+        self._lock = threading.Lock()
+
+    def client_options(self):
+        options = {}
+        if self.app.config.get('MONGO_TLS', True):
+            options.update(tls=True, tlsCAFile=certifi.where())
+        if self.app.config.get('MONGO_EVENT_LISTENERS'):
+            options['event_listeners'] = list(self.app.config['MONGO_EVENT_LISTENERS'])
+        for key, option in POOL_OPTIONS.items():
+            if self.app.config.get(key) is not None:
+                options[option] = self.app.config[key]
+        return options
+
+    def get_database(self):
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._connect()
+        return self._database
+
+    def _connect(self):
+        started = time.perf_counter()
+        # A client inherited across fork is dropped, not closed: closing it
+        # would tear down state the parent still uses.
+        client = MongoClient(self.app.config['MONGODB_URI'], **self.client_options())
+        self._client = client
+        self._database = client.get_database()
+        self._pid = os.getpid()
+        self.app.logger.info('MongoClient created for pid %s in %.1f ms',
+                             self._pid, (time.perf_counter() - started) * 1000)
+
+    def get_async_database(self):
+        # AsyncMongoClient is bound to the event loop it runs on, while Flask
+        # runs every async view on a fresh loop. The async client therefore
+        # lives on one loop thread per process; see run_async().
+        if self._async_pid != os.getpid():
+            with self._lock:
+                if self._async_pid != os.getpid():
+                    loop = asyncio.new_event_loop()
+                    threading.Thread(target=loop.run_forever, name='mongo-async', daemon=True).start()
+                    self._async_database = asyncio.run_coroutine_threadsafe(self._connect_async(), loop).result()
+                    self._async_loop = loop
+                    self._async_pid = os.getpid()
+        return self._async_loop, self._async_database
+
+    async def _connect_async(self):
+        client = AsyncMongoClient(self.app.config['MONGODB_URI'], **self.client_options())
+        return client.get_database()
+
+    def close(self):
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = self._database = self._pid = None
 
 def init_db(app):
-    uri = app.config.get("MONGODB_URI")
-    if not uri:
+    if not app.config.get("MONGODB_URI"):
         raise ValueError("MONGODB_URI is not set in app config")
 
-    client = MongoClient(
-        uri,
-        tls=True,
-        tlsCAFile=certifi.where()
-    )
-
-    # If DB name not in URI, specify here
-    app.config['MONGO_CLIENT'] = client
-    app.config['MONGO_DB'] = client.get_database()
+    app.extensions['mongo'] = MongoConnection(app)
+    app.cli.add_command(indexes_command)
 
 def get_db():
     if 'db' not in g:
-        g.db = current_app.config['MONGO_DB']
+        g.db = current_app.extensions['mongo'].get_database()
     return g.db
 
+_async_db = contextvars.ContextVar('async_db')
+
+async def run_async(coro):
+    # Await `coro` from any event loop; it runs on the process's Mongo loop,
+    # where get_async_db() returns the async database. The caller's context
+    # variables (per-request query stats among them) are carried over.
+    loop, database = current_app.extensions['mongo'].get_async_database()
+    context = contextvars.copy_context()
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(_bind(database, context, coro), loop))
+
+async def _bind(database, context, coro):
+    for var, value in context.items():
+        var.set(value)
+    _async_db.set(database)
+    return await coro
+
+def get_async_db():
+    return _async_db.get()
+
 def close_db(e=None):
     db = g.pop('db', None)
     # Mongo closes automatically; nothing to do
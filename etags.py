@@ -0,0 +1,100 @@
+import hashlib
+from functools import wraps
+from flask import current_app, request, session, make_response
+from cache import TTLCache
+from current_user import get_current_user
+from repositories import versions
+from terms import current_term
+
+# Version counters, one per scope, kept in the `versions` collection:
+#   reference:<department>  classes, subjects, staff, assignments and roster
+#   progress:<department>   any no-due status or final approval change
+#   subject:<subject_id>    no-due statuses of one subject
+#   student:<student_id>    one student's statuses and final approval
+# Write endpoints bump the scopes they touch. Read endpoints derive a strong
+# ETag from the scopes they depend on and answer a matching If-None-Match
+# with 304 before running the view. Counters are cached per process for
+# VERSION_CACHE_TTL seconds; the process that bumps a scope drops its own
+# cached value at once, other workers see the bump when the entry expires.
+
+def reference_scope(department):
+    return f'reference:{department}'
+
+def progress_scope(department):
+    return f'progress:{department}'
+
+def subject_scope(subject_id):
+    return f'subject:{subject_id}'
+
+def student_scope(student_id):
+    return f'student:{student_id}'
+
+def _version_cache():
+    cache = current_app.extensions.get('version_cache')
+    if cache is None:
+        cache = current_app.extensions['version_cache'] = TTLCache(
+            maxsize=current_app.config.get('VERSION_CACHE_SIZE', 4096),
+            ttl=current_app.config.get('VERSION_CACHE_TTL', 1)
+        )
+    return cache
+
+def get_versions(scopes):
+    cache = _version_cache()
+    current = {}
+    missing = []
+    for scope in set(scopes):
+        version = cache.get(scope)
+        if version is None:
+            missing.append(scope)
+        else:
+            current[scope] = version
+
+    if missing:
+        loaded = versions.find(missing)
+        for scope in missing:
+            current[scope] = loaded.get(scope, 0)
+            cache.set(scope, current[scope])
+    return current
+
+def bump(*scopes):
+    versions.increment(scopes)
+    cache = _version_cache()
+    for scope in scopes:
+        cache.pop(scope)
+
+def department_scopes(*builders):
+    # Scopes of the logged-in user's department, e.g.
+    # department_scopes(reference_scope, progress_scope)
+    def scopes(**kwargs):
+        department = get_current_user().department
+        return [builder(department) for builder in builders]
+    return scopes
+
+def compute_etag(scopes):
+    current = get_versions(scopes)
+    # A new term changes every response without bumping any version
+    key = '\n'.join([request.full_path, session.get('user_id', ''), f'term={current_term()}']
+                    + [f'{scope}={current[scope]}' for scope in sorted(current)])
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def conditional(scopes):
+    # `scopes(**view_kwargs)` lists the scopes the view's response depends on.
+    # Works for async views too: ensure_sync runs them to completion.
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag = compute_etag(scopes(**kwargs))
+            # Weak comparison: compressed responses carry W/"..." (see compression.py)
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+                weak = not request.if_none_match.contains(etag)
+            else:
+                response = make_response(current_app.ensure_sync(f)(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                weak = False
+            response.set_etag(etag, weak=weak)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return decorated_function
+    return decorator
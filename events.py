@@ -0,0 +1,272 @@
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+from flask import current_app, Response
+from pymongo.errors import OperationFailure, PyMongoError
+from clearance import find_clearances, get_clearances
+from repositories import users
+
+# Server-sent events for the dashboards. Two event types are pushed:
+#   subject-status  one no-due status changed; channels student:<id>, subject:<id>
+#   progress        a student's clearance summary changed; channels
+#                   student:<id>, department:<department>
+# Events come from a MongoDB change stream on no_due_status and
+# student_clearance when the deployment supports one, so every worker sees
+# every write. Otherwise the write endpoints publish to the in-process
+# broker and only subscribers connected to the same worker are notified.
+#
+# Push is off unless EVENTS_PUSH is set: the dashboards then do not open a
+# stream and show changes made elsewhere on their next load, and the event
+# endpoints answer 204, which tells EventSource not to reconnect. Turn it on
+# where open connections are cheap, i.e. gevent/eventlet workers or an ASGI
+# server.
+#
+# Every open stream occupies a worker thread for its whole life. Under sync
+# or threaded gunicorn workers (the default) a process therefore serves at
+# most EVENTS_MAX_STREAMS streams at once, each closed after
+# EVENTS_STREAM_TIMEOUT seconds; EventSource reconnects by itself, and a
+# connection over the cap is answered at once with a longer `retry`. Keep
+# the cap well below the worker's thread count so ordinary requests still
+# find a free thread. With gevent or eventlet workers (gunicorn -k gevent)
+# streams are cheap: raise the cap or set it to 0 for no limit.
+
+KEEPALIVE_INTERVAL = 15
+BUSY_RETRY_MS = 10000
+
+def _format_time(value):
+    return value.strftime('%Y-%m-%d %H:%M') if isinstance(value, datetime) else None
+
+def subject_status_event(doc):
+    return {
+        'student_id': doc['student_id'],
+        'subject_id': doc['subject_id'],
+        'status': doc.get('status', 'pending'),
+        'remarks': doc.get('remarks'),
+        'updated_at': _format_time(doc.get('updated_at'))
+    }
+
+def progress_event(doc):
+    final_status = doc.get('final_status')
+    return {
+        'student_id': doc['student_id'],
+        'approved_subjects': doc.get('approved_count', 0),
+        'total_subjects': doc.get('total_count', 0),
+        'can_request': bool(doc.get('all_approved')) and not final_status,
+        'final_status': final_status or 'not_requested',
+        'final_remarks': doc.get('final_remarks'),
+        'final_updated_at': _format_time(doc.get('final_updated_at'))
+    }
+
+class EventBroker:
+    # In-process fan-out of events to per-connection queues
+
+    def __init__(self, queue_size=100):
+        self.queue_size = queue_size
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels):
+        subscription = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            for channel in channels:
+                self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription, channels):
+        with self._lock:
+            for channel in channels:
+                subscribers = self._channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._channels[channel]
+
+    def wants(self, channels):
+        with self._lock:
+            return any(channel in self._channels for channel in channels)
+
+    def publish(self, channels, event, data):
+        with self._lock:
+            subscribers = set()
+            for channel in channels:
+                subscribers |= self._channels.get(channel, set())
+
+        for subscription in subscribers:
+            try:
+                subscription.put_nowait((event, data))
+            except queue.Full:
+                # A client that cannot keep up is told to reload instead
+                self._resync(subscription)
+
+    def _resync(self, subscription):
+        while True:
+            try:
+                subscription.get_nowait()
+            except queue.Empty:
+                break
+        subscription.put_nowait(('resync', {}))
+
+class ChangeStreamWatcher(threading.Thread):
+    # Feeds the broker from a change stream. `active` is False until the
+    # stream is open, while it is reconnecting and after the server turned
+    # change streams down; the write endpoints publish locally meanwhile.
+
+    def __init__(self, app, broker):
+        super().__init__(name='no-due-change-stream', daemon=True)
+        self.app = app
+        self.broker = broker
+        self.active = False
+
+    def run(self):
+        db = self.app.extensions['mongo'].get_database()
+        pipeline = [{'$match': {
+            'ns.coll': {'$in': ['no_due_status', 'student_clearance']},
+            'operationType': {'$in': ['insert', 'update', 'replace']}
+        }}]
+        resume_token = None
+        delay = 1
+        while True:
+            try:
+                with db.watch(pipeline, full_document='updateLookup', resume_after=resume_token) as stream:
+                    self.active = True
+                    delay = 1
+                    for change in stream:
+                        resume_token = stream.resume_token
+                        self._dispatch(change)
+            except OperationFailure as e:
+                # Standalone servers and missing privileges end up here
+                self.active = False
+                self.app.logger.info('Change streams unavailable, publishing events in-process: %s', e)
+                return
+            except PyMongoError as e:
+                self.active = False
+                self.app.logger.warning('Change stream interrupted, retrying in %ss: %s', delay, e)
+                time.sleep(delay)
+                delay = min(delay * 2, 60)
+            except Exception:
+                self.active = False
+                self.app.logger.exception('Change stream watcher stopped')
+                return
+
+    def _dispatch(self, change):
+        doc = change.get('fullDocument')
+        if not doc:
+            return
+        if change['ns']['coll'] == 'no_due_status':
+            self.broker.publish(
+                [f"student:{doc['student_id']}", f"subject:{doc['subject_id']}"],
+                'subject-status', subject_status_event(doc)
+            )
+        else:
+            self.broker.publish(
+                [f"student:{doc['student_id']}", f"department:{doc['department']}"],
+                'progress', progress_event(doc)
+            )
+
+class EventHub:
+    def __init__(self, app):
+        self.app = app
+        self.broker = EventBroker(app.config.get('EVENTS_QUEUE_SIZE', 100))
+        max_streams = app.config.get('EVENTS_MAX_STREAMS', 8)
+        self.streams = threading.BoundedSemaphore(max_streams) if max_streams else None
+        self.watcher = None
+        self._lock = threading.Lock()
+
+    def start_watcher(self):
+        # Started on the first subscription, so it runs in the serving worker
+        # rather than in a pre-fork parent
+        if not self.app.config.get('EVENTS_CHANGE_STREAMS', True):
+            return
+        with self._lock:
+            if self.watcher is None:
+                self.watcher = ChangeStreamWatcher(self.app, self.broker)
+                self.watcher.start()
+
+    @property
+    def publishes_locally(self):
+        return self.watcher is None or not self.watcher.active
+
+def push_enabled():
+    return current_app.config.get('EVENTS_PUSH', False)
+
+def _hub():
+    hub = current_app.extensions.get('events')
+    if hub is None:
+        hub = current_app.extensions.setdefault('events', EventHub(current_app._get_current_object()))
+    return hub
+
+def publish_subject_statuses(department, statuses):
+    # statuses: dicts with student_id, subject_id, status, remarks, updated_at
+    if not push_enabled():
+        return
+    hub = _hub()
+    if not hub.publishes_locally:
+        return
+    student_ids = []
+    for status in statuses:
+        hub.broker.publish(
+            [f"student:{status['student_id']}", f"subject:{status['subject_id']}"],
+            'subject-status', subject_status_event(status)
+        )
+        student_ids.append(status['student_id'])
+    publish_progress(department, student_ids)
+
+def publish_progress(department, student_ids):
+    if not push_enabled():
+        return
+    hub = _hub()
+    student_ids = list(dict.fromkeys(student_ids))
+    channels = [f'department:{department}'] + [f'student:{student_id}' for student_id in student_ids]
+    if not hub.publishes_locally or not hub.broker.wants(channels):
+        return
+    clearances = find_clearances(student_ids)
+    missing = [student_id for student_id in student_ids if student_id not in clearances]
+    if missing:
+        clearances.update(get_clearances(users.find_students_by_id(missing)))
+    for clearance in clearances.values():
+        hub.broker.publish(
+            [f'student:{clearance.student_id}', f'department:{department}'],
+            'progress', progress_event({field: getattr(clearance, field) for field in clearance._fields})
+        )
+
+def _stream_response(body):
+    return Response(body, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+def event_stream(channels):
+    if not push_enabled():
+        return Response(status=204)
+    hub = _hub()
+    if hub.streams is not None and not hub.streams.acquire(blocking=False):
+        # Every stream slot is taken; ask the client to come back later
+        return _stream_response([f'retry: {BUSY_RETRY_MS}\n\n'])
+    hub.start_watcher()
+    timeout = current_app.config.get('EVENTS_STREAM_TIMEOUT', 60)
+    channels = list(channels)
+    subscription = hub.broker.subscribe(channels)
+
+    def generate():
+        # Streams end after `timeout` seconds so a sync worker is not held
+        # forever; EventSource reconnects on its own after `retry` ms.
+        try:
+            yield 'retry: 3000\n\n'
+            deadline = time.monotonic() + timeout
+            while time.monotonic() < deadline:
+                try:
+                    event, data = subscription.get(timeout=min(KEEPALIVE_INTERVAL, max(deadline - time.monotonic(), 0.1)))
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'event: {event}\ndata: {json.dumps(data)}\n\n'
+        finally:
+            hub.broker.unsubscribe(subscription, channels)
+
+    response = _stream_response(generate())
+    if hub.streams is not None:
+        # Runs even when the body is never iterated
+        response.call_on_close(hub.streams.release)
+    return response
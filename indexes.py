@@ -0,0 +1,153 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from pymongo import ASCENDING
+from pymongo.errors import ConnectionFailure, PyMongoError
+
+# Index registry: (collection, keys, options). Keys follow the equality
+# filters used by the blueprints so every lookup is served by a prefix.
+# Applied by `flask indexes`, run once per deploy rather than by every
+# process on connect; it exits non-zero if any index cannot be built.
+INDEXES = [
+    ('users', [('email', ASCENDING)], {'unique': True, 'name': 'email_unique'}),
+    ('users', [('role', ASCENDING), ('department', ASCENDING), ('semester', ASCENDING),
+               ('class_section', ASCENDING), ('year', ASCENDING)],
+     {'name': 'role_department_semester_section_year'}),
+    ('users', [('role', ASCENDING), ('department', ASCENDING), ('_id', ASCENDING)], {'name': 'role_department_id'}),
+    ('users', [('department', ASCENDING), ('roll_number', ASCENDING)],
+     {'unique': True, 'partialFilterExpression': {'role': 'student'}, 'name': 'department_roll_number_unique'}),
+    ('classes', [('department', ASCENDING), ('year', ASCENDING), ('semester', ASCENDING),
+                 ('section', ASCENDING)],
+     {'unique': True, 'name': 'department_year_semester_section_unique'}),
+    ('classes', [('class_advisor_id', ASCENDING)], {'name': 'class_advisor_id'}),
+    ('subjects', [('department', ASCENDING), ('code', ASCENDING)],
+     {'unique': True, 'name': 'department_code_unique'}),
+    ('subjects', [('department', ASCENDING), ('semester', ASCENDING)], {'name': 'department_semester'}),
+    ('subjects', [('class_id', ASCENDING)], {'name': 'class_id'}),
+    ('staff_subjects', [('staff_id', ASCENDING), ('subject_id', ASCENDING), ('class_id', ASCENDING)],
+     {'unique': True, 'name': 'staff_subject_class_unique'}),
+    ('no_due_status', [('student_id', ASCENDING), ('subject_id', ASCENDING), ('term', ASCENDING)],
+     {'unique': True, 'name': 'student_subject_term_unique'}),
+    ('no_due_status', [('student_id', ASCENDING), ('term', ASCENDING), ('status', ASCENDING)],
+     {'name': 'student_term_status'}),
+    ('no_due_status', [('term', ASCENDING)], {'name': 'term'}),
+    ('final_approvals', [('student_id', ASCENDING), ('term', ASCENDING)],
+     {'unique': True, 'name': 'student_term_unique'}),
+    ('final_approvals', [('term', ASCENDING)], {'name': 'term'}),
+    ('no_due_status_archive', [('term', ASCENDING), ('student_id', ASCENDING)], {'name': 'term_student'}),
+    ('final_approvals_archive', [('term', ASCENDING), ('student_id', ASCENDING)], {'name': 'term_student'}),
+    ('student_clearance', [('student_id', ASCENDING)], {'unique': True, 'name': 'student_id_unique'}),
+    ('student_clearance', [('department', ASCENDING), ('semester', ASCENDING)], {'name': 'department_semester'}),
+    ('certificate_jobs', [('created_at', ASCENDING)], {'expireAfterSeconds': 86400, 'name': 'created_at_ttl'}),
+    ('roster_jobs', [('created_at', ASCENDING)], {'expireAfterSeconds': 86400, 'name': 'created_at_ttl'}),
+]
+
+# Indexes replaced by the term-scoped ones above. The old unique keys would
+# stop a student's statuses from being recorded again in a new term. A
+# one-off migration, run with `flask indexes --drop-replaced` once the new
+# code is deployed: the drops only happen after every index above exists.
+REPLACED_INDEXES = [
+    ('no_due_status', 'student_subject_unique'),
+    ('no_due_status', 'student_status'),
+    ('final_approvals', 'student_id_unique'),
+]
+
+# Query shapes issued by auth.py, student.py, staff.py and hod.py. Values are
+# placeholders; only the filter fields matter to the query planner.
+QUERY_SHAPES = [
+    ('users', {'email': 'user@college.edu'}),
+    ('users', {'role': 'student', 'department': 'CSE'}),
+    ('users', {'role': 'staff', 'department': 'CSE'}),
+    ('users', {'role': 'student', 'department': 'CSE', 'roll_number': {'$in': ['CSE001']}}),
+    ('users', {'role': 'student', 'department': 'CSE', 'semester': 1}),
+    ('users', {'role': 'student', 'department': 'CSE', 'semester': 1, 'class_section': 'A'}),
+    ('users', {'role': 'student', 'department': 'CSE', 'year': 1, 'semester': 1, 'class_section': 'A'}),
+    ('classes', {'department': 'CSE'}),
+    ('classes', {'department': 'CSE', 'year': 1, 'semester': 1, 'section': 'A'}),
+    ('classes', {'class_advisor_id': '000000000000000000000000'}),
+    ('subjects', {'department': 'CSE'}),
+    ('subjects', {'department': 'CSE', 'semester': 1}),
+    ('subjects', {'code': 'CS101', 'department': 'CSE'}),
+    ('subjects', {'class_id': '000000000000000000000000'}),
+    ('staff_subjects', {'staff_id': '000000000000000000000000'}),
+    ('staff_subjects', {'staff_id': '000000000000000000000000', 'subject_id': '000000000000000000000000',
+                        'class_id': '000000000000000000000000'}),
+    ('no_due_status', {'student_id': '000000000000000000000000', 'subject_id': '000000000000000000000000',
+                       'term': '2025-26 odd'}),
+    ('no_due_status', {'student_id': '000000000000000000000000', 'status': 'approved', 'term': '2025-26 odd'}),
+    ('no_due_status', {'term': {'$ne': '2025-26 odd'}}),
+    ('final_approvals', {'student_id': '000000000000000000000000', 'term': '2025-26 odd'}),
+    ('student_clearance', {'student_id': '000000000000000000000000'}),
+    ('student_clearance', {'department': 'CSE', 'semester': 1}),
+]
+
+def ensure_indexes(db):
+    # create_index is a no-op when an identical index already exists
+    errors = []
+    for collection, keys, options in INDEXES:
+        try:
+            db[collection].create_index(keys, **options)
+        except ConnectionFailure:
+            raise
+        except PyMongoError as e:
+            errors.append((collection, options['name'], str(e)))
+    return errors
+
+def replaced_indexes(db):
+    # The REPLACED_INDEXES still present
+    return [(collection, name) for collection, name in REPLACED_INDEXES
+            if name in db[collection].index_information()]
+
+def drop_replaced_indexes(db):
+    # Returns the names dropped
+    dropped = []
+    for collection, name in replaced_indexes(db):
+        db[collection].drop_index(name)
+        dropped.append(f'{collection}.{name}')
+    return dropped
+
+def _has_collscan(plan):
+    if isinstance(plan, dict):
+        if plan.get('stage') == 'COLLSCAN':
+            return True
+        return any(_has_collscan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(value) for value in plan)
+    return False
+
+def verify_indexes(db):
+    failures = []
+    for collection, query in QUERY_SHAPES:
+        explain = db[collection].find(query).explain()
+        if _has_collscan(explain.get('queryPlanner', {}).get('winningPlan', {})):
+            failures.append((collection, query))
+    return failures
+
+@click.command('indexes')
+@click.option('--verify', is_flag=True, help='Explain every registered query shape and fail on COLLSCAN.')
+@click.option('--drop-replaced', is_flag=True,
+              help='After creating the indexes, drop the pre-term ones they replace (one-off migration).')
+@with_appcontext
+def indexes_command(verify, drop_replaced):
+    db = current_app.extensions['mongo'].get_database()
+
+    errors = ensure_indexes(db)
+    for collection, name, message in errors:
+        click.echo(f'Failed to create {collection}.{name}: {message}', err=True)
+    if errors:
+        # A missing unique index lets duplicate accounts and statuses in;
+        # stop the deploy rather than carry on without it
+        raise SystemExit(1)
+    click.echo(f'{len(INDEXES)} indexes in place')
+
+    if drop_replaced:
+        dropped = drop_replaced_indexes(db)
+        click.echo(f"Dropped {', '.join(dropped)}" if dropped else 'No replaced indexes left')
+
+    if verify:
+        failures = verify_indexes(db)
+        for collection, query in failures:
+            click.echo(f'COLLSCAN: {collection}.find({sorted(query)})', err=True)
+        if failures:
+            raise SystemExit(1)
+        click.echo(f'{len(QUERY_SHAPES)} query shapes use an index')
@@ -0,0 +1,46 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import request, jsonify
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Keyset pagination over _id. Clients pass ?limit=N&after=<id>; the response
+# body stays a JSON array and the cursor for the next page, if any, is sent
+# in the X-Next-Cursor header.
+
+def page_args():
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        limit = DEFAULT_PAGE_SIZE
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    try:
+        after = ObjectId(request.args['after']) if request.args.get('after') else None
+    except InvalidId:
+        after = None
+    return limit, after
+
+def chunks(cursor, size):
+    chunk = []
+    for document in cursor:
+        chunk.append(document)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def paginated_response(items, limit):
+    # `items` holds up to limit + 1 rows; the extra row only signals another page
+    response = jsonify(items[:limit])
+    if len(items) > limit:
+        response.headers['X-Next-Cursor'] = items[limit - 1]['id']
+    return response
+
+def bool_arg(name):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return None
+    return value.lower() in ('1', 'true', 'yes')
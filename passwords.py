@@ -0,0 +1,158 @@
+import hmac
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# Password hashing. Hashes are werkzeug's "method$salt$hash" strings made
+# with PASSWORD_HASH_METHOD; the method carries its work factor (for
+# example scrypt:32768:8:1 or pbkdf2:sha256:600000). A stored value made
+# with another method, or a plaintext password from before hashing, is
+# rehashed the next time its owner logs in. Methods below werkzeug's work
+# factors (pbkdf2 600000 iterations, scrypt n=2**15) are refused. Accounts
+# created in bulk (roster imports) use the same method; their hashes are
+# spread over the pool in small jobs, and at most PASSWORD_HASH_WORKERS of
+# them are in flight, so logins can still queue behind an import.
+#
+# Hashing is CPU-bound by design, so it runs on a small per-process pool
+# (PASSWORD_HASH_WORKERS threads) rather than in the request thread. At
+# most PASSWORD_HASH_QUEUE jobs wait behind the workers; past that, or when
+# a job waits longer than PASSWORD_HASH_TIMEOUT seconds, HasherBusy is
+# raised and the caller answers 503, so a login surge cannot tie up every
+# request thread.
+
+_HASH_METHODS = ('scrypt', 'pbkdf2')
+MIN_PBKDF2_ITERATIONS = 600000
+MIN_SCRYPT_N = 2 ** 15
+BULK_CHUNK_SIZE = 8
+
+class HasherBusy(Exception):
+    pass
+
+def _method(stored):
+    return stored.split('$', 1)[0]
+
+def is_hashed(stored):
+    return bool(stored) and stored.count('$') == 2 and _method(stored).split(':', 1)[0] in _HASH_METHODS
+
+def needs_rehash(stored, method):
+    return not is_hashed(stored) or _method(stored) != method
+
+def _verify(stored, password, method):
+    # Returns (matches, new hash or None)
+    if not stored or not isinstance(password, str):
+        return False, None
+    if is_hashed(stored):
+        matches = check_password_hash(stored, password)
+    else:
+        matches = hmac.compare_digest(stored.encode('utf-8'), password.encode('utf-8'))
+    if matches and needs_rehash(stored, method):
+        return True, generate_password_hash(password, method=method)
+    return matches, None
+
+def check_method(method):
+    # Raises ValueError for unknown methods and work factors below the floor
+    name, *args = method.split(':')
+    if name == 'pbkdf2':
+        iterations = int(args[1]) if len(args) > 1 else MIN_PBKDF2_ITERATIONS
+        if iterations < MIN_PBKDF2_ITERATIONS:
+            raise ValueError(f'{method}: at least {MIN_PBKDF2_ITERATIONS} pbkdf2 iterations are required')
+    elif name == 'scrypt':
+        n = int(args[0]) if args else MIN_SCRYPT_N
+        if n < MIN_SCRYPT_N:
+            raise ValueError(f'{method}: scrypt n must be at least {MIN_SCRYPT_N}')
+    else:
+        raise ValueError(f'{method}: unsupported password hash method')
+    return method
+
+def _hash_all(passwords, method):
+    return [generate_password_hash(password, method=method) for password in passwords]
+
+class PasswordHasher:
+    def __init__(self, workers=2, queue_size=32, timeout=10):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self._executor = None
+        self._slots = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Threads do not survive fork; a forked worker builds its own pool
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+                    self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+                    self._pid = os.getpid()
+        return self._executor, self._slots
+
+    def run(self, fn, *args):
+        executor, slots = self._pool()
+        if not slots.acquire(blocking=False):
+            raise HasherBusy()
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherBusy()
+
+    def run_chunks(self, fn, items, chunk_size, *args):
+        # fn(chunk, *args) for every chunk of `items`, results concatenated.
+        # At most `workers` chunks are queued at once; each waits for room
+        # up to the timeout, then HasherBusy is raised.
+        executor, slots = self._pool()
+        chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+        window = threading.BoundedSemaphore(self.workers)
+        futures = []
+        try:
+            for chunk in chunks:
+                if not window.acquire(timeout=self.timeout):
+                    raise HasherBusy()
+                if not slots.acquire(timeout=self.timeout):
+                    window.release()
+                    raise HasherBusy()
+                try:
+                    future = executor.submit(fn, chunk, *args)
+                except BaseException:
+                    slots.release()
+                    window.release()
+                    raise
+                future.add_done_callback(lambda _: (slots.release(), window.release()))
+                futures.append(future)
+            return [result for future in futures for result in future.result()]
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+def _hasher():
+    hasher = current_app.extensions.get('password_hasher')
+    if hasher is None:
+        hasher = current_app.extensions.setdefault('password_hasher', PasswordHasher(
+            workers=current_app.config.get('PASSWORD_HASH_WORKERS', 2),
+            queue_size=current_app.config.get('PASSWORD_HASH_QUEUE', 32),
+            timeout=current_app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+        ))
+    return hasher
+
+def hash_method():
+    return check_method(current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1'))
+
+def hash_password(password):
+    return _hasher().run(generate_password_hash, password, hash_method())
+
+def verify_password(stored, password):
+    # Returns (matches, new hash to store or None)
+    return _hasher().run(_verify, stored, password, hash_method())
+
+def hash_passwords(passwords):
+    # A batch of new accounts, in order
+    return _hasher().run_chunks(_hash_all, list(passwords), BULK_CHUNK_SIZE, hash_method())
@@ -0,0 +1,151 @@
+import contextvars
+import json
+import logging
+from flask import g, request
+from pymongo import monitoring
+
+# Per-request MongoDB instrumentation. A CommandListener registered on the
+# client adds every command to the stats of the request that issued it: the
+# command count, the total time spent in MongoDB and the slowest command.
+# These are sent as a Server-Timing header and logged as one JSON line, at
+# DEBUG for ordinary requests so production logs only carry the problems.
+#
+# Commands are also grouped by shape (command, collection and filter with
+# the values stripped). When one shape repeats more than
+# QUERY_N_PLUS_ONE_THRESHOLD times in a request, or the request spends at
+# least QUERY_SLOW_MS in MongoDB, the line is logged as a WARNING and flags
+# the likely N+1 or the slow request.
+#
+# Listener callbacks run in the thread that sent the command, so the stats
+# are found through a context variable; database.run_async carries it over
+# to the async client's loop.
+
+# Handshake and session housekeeping the driver issues on its own
+IGNORED_COMMANDS = {'hello', 'ismaster', 'ping', 'endsessions', 'saslstart', 'saslcontinue', 'buildinfo'}
+
+# Where each command keeps its filter
+_FILTER_FIELDS = {
+    'find': 'filter',
+    'aggregate': 'pipeline',
+    'count': 'query',
+    'distinct': 'query',
+    'findAndModify': 'query',
+    'update': 'updates',
+    'delete': 'deletes'
+}
+
+_current_stats = contextvars.ContextVar('query_stats', default=None)
+
+def _strip_values(value):
+    if isinstance(value, dict):
+        return {key: _strip_values(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = _strip_values(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return '?'
+
+def query_shape(command_name, command):
+    collection = command.get(command_name)
+    value = command.get(_FILTER_FIELDS.get(command_name), {})
+    if command_name in ('update', 'delete'):
+        # Only the statements' filters; update documents and options vary freely
+        value = [statement.get('q') for statement in value]
+    if command_name == 'distinct':
+        collection = f"{collection}.{command.get('key')}"
+    return f'{command_name} {collection} {json.dumps(_strip_values(value), sort_keys=True, default=str)}'
+
+class RequestStats:
+    def __init__(self):
+        self.commands = 0
+        self.db_ms = 0.0
+        self.slowest = None         # (ms, command name, collection)
+        self.shapes = {}
+        self._pending = {}
+
+    def started(self, event):
+        self.commands += 1
+        if event.command_name == 'getMore':
+            # Further batches of one cursor are not repeated queries
+            self._pending[event.request_id] = (event.command_name, event.command.get('collection'))
+        else:
+            self._pending[event.request_id] = (event.command_name, event.command.get(event.command_name))
+            shape = query_shape(event.command_name, event.command)
+            self.shapes[shape] = self.shapes.get(shape, 0) + 1
+
+    def finished(self, event):
+        command_name, collection = self._pending.pop(event.request_id, (event.command_name, None))
+        ms = event.duration_micros / 1000
+        self.db_ms += ms
+        if self.slowest is None or ms > self.slowest[0]:
+            self.slowest = (ms, command_name, collection)
+
+    def repeated_shapes(self, threshold):
+        return {shape: count for shape, count in self.shapes.items() if count > threshold}
+
+class QueryTimingListener(monitoring.CommandListener):
+    def started(self, event):
+        stats = _current_stats.get()
+        if stats is not None and event.command_name.lower() not in IGNORED_COMMANDS:
+            stats.started(event)
+
+    def succeeded(self, event):
+        stats = _current_stats.get()
+        if stats is not None and event.command_name.lower() not in IGNORED_COMMANDS:
+            stats.finished(event)
+
+    def failed(self, event):
+        self.succeeded(event)
+
+def init_query_timing(app):
+    if not app.config.get('QUERY_TIMING', True):
+        return
+    # Must be in place before the first get_database() builds the client
+    app.config['MONGO_EVENT_LISTENERS'] = list(app.config.get('MONGO_EVENT_LISTENERS') or []) + [QueryTimingListener()]
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = RequestStats()
+        _current_stats.set(g.query_stats)
+
+    @app.after_request
+    def report_query_stats(response):
+        # Streamed bodies run their queries after this point and are not counted
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+
+        timing = f'db;dur={stats.db_ms:.1f};desc="{stats.commands} commands"'
+        if stats.slowest:
+            ms, command_name, collection = stats.slowest
+            timing += f', db-slowest;dur={ms:.1f};desc="{command_name} {collection}"'
+        existing = response.headers.get('Server-Timing')
+        response.headers['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+
+        repeated = stats.repeated_shapes(app.config.get('QUERY_N_PLUS_ONE_THRESHOLD', 10))
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'commands': stats.commands,
+            'db_ms': round(stats.db_ms, 1),
+            'slowest': {
+                'command': stats.slowest[1], 'collection': stats.slowest[2], 'ms': round(stats.slowest[0], 1)
+            } if stats.slowest else None
+        }
+        if repeated:
+            record['n_plus_one'] = [{'shape': shape, 'count': count} for shape, count in repeated.items()]
+        if stats.db_ms >= app.config.get('QUERY_SLOW_MS', 500):
+            record['slow'] = True
+        if repeated or record.get('slow'):
+            app.logger.warning('mongo %s', json.dumps(record, default=str))
+        elif app.logger.isEnabledFor(logging.DEBUG):
+            app.logger.debug('mongo %s', json.dumps(record, default=str))
+        return response
+
+    @app.teardown_request
+    def end_query_stats(e=None):
+        _current_stats.set(None)
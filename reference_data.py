@@ -0,0 +1,75 @@
+from flask import current_app
+from cache import TTLCache
+from etags import bump, get_versions, reference_scope
+from repositories import classes, staff_subjects, subjects, users
+
+# Per-department snapshot of data that rarely changes during a term:
+#   subjects     {subject_id: Subject}
+#   classes      {class_id: Class}
+#   staff        {user_id: name} for staff and HOD accounts
+#   assignments  {staff_id: [StaffSubject, ...]}
+# Snapshots are read-only; writers call invalidate_department() instead of
+# patching them. Each snapshot remembers the reference:<department> version
+# it was loaded at, so a bump from any worker also retires it here.
+
+def _reference_cache():
+    cache = current_app.extensions.get('reference_cache')
+    if cache is None:
+        cache = current_app.extensions['reference_cache'] = TTLCache(
+            maxsize=current_app.config.get('REFERENCE_CACHE_SIZE', 64),
+            ttl=current_app.config.get('REFERENCE_CACHE_TTL', 300)
+        )
+    return cache
+
+def _load(department):
+    staff = {member.id: member.name for member in users.find_staff(department, roles=('staff', 'hod'))}
+    assignments = {}
+    for assignment in staff_subjects.find_for_staff(staff):
+        assignments.setdefault(assignment.staff_id, []).append(assignment)
+
+    return {
+        'subjects': {subject.id: subject for subject in subjects.find(department)},
+        'classes': {cls.id: cls for cls in classes.find(department)},
+        'staff': staff,
+        'assignments': assignments
+    }
+
+def get_reference_data(department):
+    scope = reference_scope(department)
+    version = get_versions([scope])[scope]
+    cache = _reference_cache()
+    entry = cache.get(department)
+    if entry is None or entry[0] != version:
+        entry = (version, _load(department))
+        cache.set(department, entry)
+    return entry[1]
+
+def invalidate_department(department):
+    _reference_cache().pop(department)
+    bump(reference_scope(department))
+
+def semester_subjects(data, semester):
+    return [subject for subject in data['subjects'].values() if subject.semester == semester]
+
+# Lookups fall back to the database for ids outside the cached department
+
+def get_subject(data, subject_id):
+    subject = data['subjects'].get(subject_id)
+    if subject is None:
+        subject = subjects.get(subject_id)
+    return subject
+
+def get_class(data, class_id):
+    cls = data['classes'].get(class_id)
+    if cls is None:
+        cls = classes.get(class_id)
+    return cls
+
+def get_staff_name(data, staff_id):
+    name = data['staff'].get(staff_id)
+    if name is None:
+        name = users.names([staff_id]).get(staff_id)
+    return name
+
+def reference_cache_stats():
+    return _reference_cache().stats()
@@ -0,0 +1,173 @@
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape
+from repositories import users
+
+# Department no-due report. Rows come from one cursor and are written out in
+# batches, so memory stays flat no matter how many students are exported.
+
+BATCH_SIZE = 500
+
+def no_due_header(subjects):
+    return (['Roll Number', 'Name', 'Year', 'Semester', 'Section']
+            + [subject.code for subject in subjects]
+            + ['Remarks', 'Final Status', 'Final Remarks'])
+
+def no_due_rows(department, subjects, class_section=None):
+    # `subjects` fixes the status columns; a student only has a status for
+    # subjects of their own semester, other cells stay blank.
+    for student in users.no_due_report(department, class_section, batch_size=BATCH_SIZE):
+        statuses = {status['subject_id']: status for status in student.statuses}
+        cells = []
+        remarks = []
+        for subject in subjects:
+            if subject.semester != student.semester:
+                cells.append('')
+                continue
+            status = statuses.get(subject.id)
+            cells.append(status['status'] if status else 'pending')
+            if status and status.get('remarks'):
+                remarks.append(f"{subject.code}: {status['remarks']}")
+
+        yield ([student.roll_number, student.name, student.year, student.semester, student.class_section]
+               + cells
+               + ['; '.join(remarks), student.final_status, student.final_remarks])
+
+class _Buffer:
+    # Write target that hands back whatever was written since the last drain
+
+    def __init__(self):
+        self.parts = []
+
+    def write(self, data):
+        # csv.writer hands over text, zipfile hands over bytes
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+# Spreadsheets evaluate a CSV cell starting with one of these as a formula
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        # Names, remarks and codes are user input; a leading ' keeps them text
+        return "'" + value
+    return value
+
+def stream_csv(header, rows):
+    buffer = _Buffer()
+    writer = csv.writer(buffer)
+    writer.writerow([_csv_value(value) for value in header])
+    for count, row in enumerate(rows, 1):
+        writer.writerow([_csv_value(value) for value in row])
+        if count % BATCH_SIZE == 0:
+            yield buffer.drain()
+    yield buffer.drain()
+
+# Minimal SpreadsheetML package. Strings are written inline, so the sheet
+# can be streamed without building a shared string table first.
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    )
+}
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+
+# Characters XML 1.0 cannot carry, plus the ones Excel rejects in sheet names
+_INVALID_XML = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_INVALID_SHEET_NAME = re.compile(r'[\[\]:*?/\\]')
+
+def _cell(value):
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_INVALID_XML.sub('', str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+def _row(values):
+    return '<row>' + ''.join(_cell(value) for value in values) + '</row>'
+
+def stream_xlsx(header, rows, sheet_name='Sheet1'):
+    buffer = _Buffer()
+    sheet_name = _INVALID_SHEET_NAME.sub('', sheet_name)[:31] or 'Sheet1'
+
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as package:
+        for name, content in _XLSX_PARTS.items():
+            package.writestr(name, content)
+        package.writestr('xl/workbook.xml', _WORKBOOK.format(name=escape(sheet_name, {'"': '&quot;'})))
+        yield buffer.drain()
+
+        with package.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(_row(header).encode('utf-8'))
+            for count, row in enumerate(rows, 1):
+                sheet.write(_row(row).encode('utf-8'))
+                if count % BATCH_SIZE == 0:
+                    yield buffer.drain()
+            sheet.write(b'</sheetData></worksheet>')
+
+    yield buffer.drain()
@@ -0,0 +1,2 @@
+# Query functions for each collection. Every function projects only the
+# fields of the record type it returns; see records.py.
@@ -0,0 +1,62 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from bson import ObjectId
+from database import get_async_db
+from repositories.records import Class, Clearance, NoDueStatus, Student, Subject
+from terms import with_term
+
+# Async reads behind the HOD class views. They run on the Mongo event loop
+# (database.run_async), so callers can issue independent ones together with
+# asyncio.gather. Term-scoped reads take the term from the caller
+# (terms.current_term() on the request side).
+
+async def get_class(class_id: str) -> Optional[Class]:
+    doc = await get_async_db().classes.find_one({'_id': ObjectId(class_id)}, Class.projection())
+    return Class.from_doc(doc) if doc else None
+
+async def find_class_students(cls: Class, after: Optional[ObjectId] = None,
+                              limit: Optional[int] = None) -> List[Student]:
+    query = {'role': 'student', 'department': cls.department, 'year': cls.year,
+             'semester': cls.semester, 'class_section': cls.section}
+    if after is not None:
+        query['_id'] = {'$gt': after}
+
+    cursor = get_async_db().users.find(query, Student.projection()).sort('_id', 1)
+    if limit:
+        cursor = cursor.limit(limit)
+    return [Student.from_doc(doc) for doc in await cursor.to_list(None)]
+
+async def find_subjects(department: str, semester: int) -> List[Subject]:
+    cursor = get_async_db().subjects.find({'department': department, 'semester': semester}, Subject.projection())
+    return [Subject.from_doc(doc) for doc in await cursor.to_list(None)]
+
+async def find_clearances(student_ids: Iterable[str], term: Optional[str]) -> Dict[str, Clearance]:
+    # Summaries of `term` only; see clearance.py
+    cursor = get_async_db().student_clearance.find({'student_id': {'$in': list(student_ids)}, 'term': term},
+                                                   Clearance.projection())
+    return {doc['student_id']: Clearance.from_doc(doc) for doc in await cursor.to_list(None)}
+
+async def find_remarks(student_ids: Iterable[str], subject_ids: Iterable[str],
+                       term: Optional[str]) -> List[NoDueStatus]:
+    # Statuses that carry a remark, for teacher notes
+    cursor = get_async_db().no_due_status.find(with_term({
+        'student_id': {'$in': list(student_ids)},
+        'subject_id': {'$in': list(subject_ids)},
+        'remarks': {'$nin': [None, '']}
+    }, term), NoDueStatus.projection())
+    return [NoDueStatus.from_doc(doc) for doc in await cursor.to_list(None)]
+
+async def names(user_ids: Iterable[str]) -> Dict[str, str]:
+    ids = [ObjectId(user_id) for user_id in set(user_ids)]
+    if not ids:
+        return {}
+    cursor = get_async_db().users.find({'_id': {'$in': ids}}, {'name': 1})
+    return {str(doc['_id']): doc['name'] for doc in await cursor.to_list(None)}
+
+async def find_status_cells(student_ids: Iterable[str], subject_ids: Iterable[str],
+                            term: Optional[str]) -> List[Tuple[str, str, str]]:
+    # (student_id, subject_id, status) for every decided pair
+    cursor = get_async_db().no_due_status.find(
+        with_term({'student_id': {'$in': list(student_ids)}, 'subject_id': {'$in': list(subject_ids)}}, term),
+        {'_id': 0, 'student_id': 1, 'subject_id': 1, 'status': 1}
+    )
+    return [(doc['student_id'], doc['subject_id'], doc.get('status')) for doc in await cursor.to_list(None)]
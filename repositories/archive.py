@@ -0,0 +1,40 @@
+from typing import Dict, List
+from pymongo.errors import BulkWriteError
+from database import get_db
+
+# Moves no_due_status and final_approvals documents of closed terms into
+# `<collection>_archive`. Each batch is copied before it is deleted, and a
+# copy that already exists is skipped, so an interrupted run can simply be
+# started again.
+
+TERM_COLLECTIONS = ('no_due_status', 'final_approvals')
+
+def stamp_missing(collection: str, term: str) -> int:
+    # Documents written before terms existed
+    result = get_db()[collection].update_many({'term': {'$exists': False}}, {'$set': {'term': term}})
+    return result.modified_count
+
+def archive_batch(collection: str, active_term: str, batch_size: int = 1000) -> int:
+    db = get_db()
+    docs = list(db[collection].find({'term': {'$exists': True, '$ne': active_term}}).sort('_id', 1).limit(batch_size))
+    if not docs:
+        return 0
+
+    try:
+        db[f'{collection}_archive'].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Duplicate _ids were copied by an earlier, interrupted run
+        if any(error['code'] != 11000 for error in e.details['writeErrors']):
+            raise
+    db[collection].delete_many({'_id': {'$in': [doc['_id'] for doc in docs]}})
+    return len(docs)
+
+def term_counts(collection: str) -> List[Dict]:
+    # [{'term': ..., 'count': ...}] for the live collection, oldest term first
+    return [
+        {'term': doc['_id'], 'count': doc['count']}
+        for doc in get_db()[collection].aggregate([
+            {'$group': {'_id': '$term', 'count': {'$sum': 1}}},
+            {'$sort': {'_id': 1}}
+        ])
+    ]
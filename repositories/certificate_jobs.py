@@ -0,0 +1,16 @@
+from datetime import datetime
+from typing import Optional
+from database import get_db
+
+# Progress of certificate batches, so any worker can answer a status poll.
+# Documents expire a day after creation (see indexes.py).
+
+def create(job_id: str, **fields) -> None:
+    now = datetime.utcnow()
+    get_db().certificate_jobs.insert_one(dict(fields, _id=job_id, created_at=now, updated_at=now))
+
+def get(job_id: str) -> Optional[dict]:
+    return get_db().certificate_jobs.find_one({'_id': job_id})
+
+def update(job_id: str, **fields) -> None:
+    get_db().certificate_jobs.update_one({'_id': job_id}, {'$set': dict(fields, updated_at=datetime.utcnow())})
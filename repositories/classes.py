@@ -0,0 +1,39 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from bson import ObjectId
+from database import get_db
+from repositories.records import Class
+
+def get(class_id: str) -> Optional[Class]:
+    doc = get_db().classes.find_one({'_id': ObjectId(class_id)}, Class.projection())
+    return Class.from_doc(doc) if doc else None
+
+def find(department: str) -> List[Class]:
+    return [Class.from_doc(doc) for doc in get_db().classes.find({'department': department}, Class.projection())]
+
+def exists(department: str, year: int, semester: int, section: str) -> bool:
+    return get_db().classes.find_one(
+        {'department': department, 'year': year, 'semester': semester, 'section': section},
+        {'_id': 1}
+    ) is not None
+
+def insert(name: str, department: str, year: int, semester: int, section: str) -> str:
+    result = get_db().classes.insert_one({
+        'name': name,
+        'department': department,
+        'year': year,
+        'semester': semester,
+        'section': section,
+        'class_advisor_id': None,
+        'created_at': datetime.utcnow()
+    })
+    return str(result.inserted_id)
+
+def set_advisor(class_id: str, staff_id: str) -> None:
+    get_db().classes.update_one({'_id': ObjectId(class_id)}, {'$set': {'class_advisor_id': staff_id}})
+
+def counts_advised_by(staff_ids: Iterable[str]) -> Dict[str, int]:
+    return {row['_id']: row['count'] for row in get_db().classes.aggregate([
+        {'$match': {'class_advisor_id': {'$in': list(staff_ids)}}},
+        {'$group': {'_id': '$class_advisor_id', 'count': {'$sum': 1}}}
+    ])}
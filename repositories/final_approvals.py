@@ -0,0 +1,55 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+from pymongo import UpdateOne
+from database import get_db
+from repositories.records import FinalApproval
+from terms import term_match
+
+def get_for_student(student_id: str) -> Optional[FinalApproval]:
+    doc = get_db().final_approvals.find_one(term_match({'student_id': student_id}), FinalApproval.projection())
+    return FinalApproval.from_doc(doc) if doc else None
+
+def find_for_students(student_ids: Iterable[str]) -> Dict[str, FinalApproval]:
+    return {
+        doc['student_id']: FinalApproval.from_doc(doc)
+        for doc in get_db().final_approvals.find(term_match({'student_id': {'$in': list(student_ids)}}),
+                                                    FinalApproval.projection())
+    }
+
+def request(student_id: str) -> datetime:
+    now = datetime.utcnow()
+    get_db().final_approvals.insert_one(term_match({
+        'student_id': student_id,
+        'status': 'pending',
+        'approved_by': None,
+        'remarks': None,
+        'created_at': now,
+        'updated_at': now
+    }))
+    return now
+
+def decide(student_id: str, status: str, approved_by: str, remarks: str) -> Optional[datetime]:
+    # Returns the update time, or None when the student never requested approval
+    now = datetime.utcnow()
+    result = get_db().final_approvals.update_one(
+        term_match({'student_id': student_id}),
+        {'$set': {'status': status, 'approved_by': approved_by, 'remarks': remarks, 'updated_at': now}}
+    )
+    return now if result.matched_count else None
+
+def approve_many(student_ids: List[str], approved_by: str, remarks: str) -> datetime:
+    # One bulk write; students without a request get an approved record
+    now = datetime.utcnow()
+    if student_ids:
+        get_db().final_approvals.bulk_write([
+            UpdateOne(
+                term_match({'student_id': student_id}),
+                {
+                    '$set': {'status': 'approved', 'approved_by': approved_by, 'remarks': remarks, 'updated_at': now},
+                    '$setOnInsert': {'created_at': now}
+                },
+                upsert=True
+            )
+            for student_id in student_ids
+        ], ordered=False)
+    return now
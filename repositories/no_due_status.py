@@ -0,0 +1,106 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from database import get_db
+from repositories.records import NoDueStatus
+from terms import term_match
+
+def find_for_subject(subject_id: str, student_ids: Iterable[str]) -> Dict[str, NoDueStatus]:
+    return {
+        doc['student_id']: NoDueStatus.from_doc(doc)
+        for doc in get_db().no_due_status.find(
+            term_match({'student_id': {'$in': list(student_ids)}, 'subject_id': subject_id}),
+            NoDueStatus.projection()
+        )
+    }
+
+def find_for_student(student_id: str, subject_ids: Iterable[str]) -> Dict[str, NoDueStatus]:
+    return {
+        doc['subject_id']: NoDueStatus.from_doc(doc)
+        for doc in get_db().no_due_status.find(
+            term_match({'student_id': student_id, 'subject_id': {'$in': list(subject_ids)}}),
+            NoDueStatus.projection()
+        )
+    }
+
+def find_for_students(student_ids: Iterable[str], subject_ids: Iterable[str]) -> List[NoDueStatus]:
+    return [
+        NoDueStatus.from_doc(doc)
+        for doc in get_db().no_due_status.find(
+            term_match({'student_id': {'$in': list(student_ids)}, 'subject_id': {'$in': list(subject_ids)}}),
+            NoDueStatus.projection()
+        )
+    ]
+
+def approved_subject_ids(student_ids: Iterable[str]) -> Dict[str, List[str]]:
+    approved = {}
+    for doc in get_db().no_due_status.find(
+        term_match({'student_id': {'$in': list(student_ids)}, 'status': 'approved'}),
+        {'student_id': 1, 'subject_id': 1}
+    ):
+        approved.setdefault(doc['student_id'], []).append(doc['subject_id'])
+    return approved
+
+def approved_students_by_subject(subject_ids: Iterable[str]) -> Dict[str, Set[str]]:
+    return {
+        row['_id']: set(row['student_ids'])
+        for row in get_db().no_due_status.aggregate([
+            {'$match': term_match({'subject_id': {'$in': list(subject_ids)}, 'status': 'approved'})},
+            {'$group': {'_id': '$subject_id', 'student_ids': {'$addToSet': '$student_id'}}}
+        ])
+    }
+
+def decided_student_ids(subject_id: str, student_ids: Iterable[str]) -> Set[str]:
+    return {
+        doc['student_id']
+        for doc in get_db().no_due_status.find(term_match({
+            'student_id': {'$in': list(student_ids)},
+            'subject_id': subject_id,
+            'status': {'$in': ['approved', 'rejected']}
+        }), {'student_id': 1})
+    }
+
+def status_counts(subject_id: str, student_ids: Iterable[str]) -> Dict[str, int]:
+    # {status: count} over the given students' statuses for one subject
+    return {
+        doc['_id']: doc['count']
+        for doc in get_db().no_due_status.aggregate([
+            {'$match': term_match({'student_id': {'$in': list(student_ids)}, 'subject_id': subject_id})},
+            {'$group': {'_id': '$status', 'count': {'$sum': 1}}}
+        ])
+    }
+
+def record_decisions(decisions: List[Tuple[str, str, str, str]], approved_by: str,
+                     approved_by_name: Optional[str] = None) -> Dict[int, str]:
+    # decisions: (student_id, subject_id, action, remarks). Upserts keyed on
+    # (student_id, subject_id) within the term, so concurrent writes never
+    # create a second row for the same pair. The approver's name is stored alongside the id so
+    # readers need no user lookup. Returns {position: error message} for
+    # failed writes.
+    now = datetime.utcnow()
+    updates = [
+        UpdateOne(
+            term_match({'student_id': student_id, 'subject_id': subject_id}),
+            {
+                '$set': {
+                    'status': 'approved' if action == 'approve' else 'rejected',
+                    'approved_by': approved_by,
+                    'approved_by_name': approved_by_name,
+                    'remarks': remarks,
+                    'updated_at': now
+                },
+                '$setOnInsert': {'created_at': now}
+            },
+            upsert=True
+        )
+        for student_id, subject_id, action, remarks in decisions
+    ]
+    if not updates:
+        return {}
+
+    try:
+        get_db().no_due_status.bulk_write(updates, ordered=False)
+    except BulkWriteError as e:
+        return {error['index']: error.get('errmsg', 'Write failed') for error in e.details.get('writeErrors', [])}
+    return {}
@@ -0,0 +1,145 @@
+from datetime import datetime
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Type, TypeVar
+
+R = TypeVar('R', bound='Record')
+
+class Record:
+    # Compact read-only view of a Mongo document. Subclasses list their
+    # fields in __slots__; the same list drives the query projection, so a
+    # record never pulls more from the server than it exposes.
+    __slots__ = ('id',)
+    _fields: Tuple[str, ...] = ()
+
+    id: str
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = []
+        for klass in reversed(cls.__mro__):
+            for field in klass.__dict__.get('__slots__', ()):
+                if field != 'id' and field not in fields:
+                    fields.append(field)
+        cls._fields = tuple(fields)
+
+    @classmethod
+    def projection(cls) -> Dict[str, int]:
+        return {field: 1 for field in cls._fields}
+
+    @classmethod
+    def from_doc(cls: Type[R], doc: Mapping[str, Any]) -> R:
+        record = cls.__new__(cls)
+        record.id = str(doc['_id'])
+        for field in cls._fields:
+            setattr(record, field, doc.get(field))
+        return record
+
+    def __repr__(self):
+        return f'{type(self).__name__}(id={self.id!r})'
+
+class User(Record):
+    __slots__ = ('name', 'email', 'role', 'department', 'class_section', 'year', 'semester', 'roll_number')
+
+    name: str
+    email: str
+    role: str
+    department: str
+    class_section: Optional[str]
+    year: Optional[int]
+    semester: Optional[int]
+    roll_number: Optional[str]
+
+class Student(Record):
+    __slots__ = ('name', 'roll_number', 'department', 'year', 'semester', 'class_section')
+
+    name: str
+    roll_number: Optional[str]
+    department: str
+    year: Optional[int]
+    semester: Optional[int]
+    class_section: Optional[str]
+
+class Class(Record):
+    __slots__ = ('name', 'department', 'year', 'semester', 'section', 'class_advisor_id')
+
+    name: str
+    department: str
+    year: int
+    semester: int
+    section: str
+    class_advisor_id: Optional[str]
+
+class Subject(Record):
+    __slots__ = ('name', 'code', 'department', 'semester', 'credits', 'class_id')
+
+    name: str
+    code: str
+    department: str
+    semester: int
+    credits: int
+    class_id: Optional[str]
+
+class StaffSubject(Record):
+    __slots__ = ('staff_id', 'subject_id', 'class_id')
+
+    staff_id: str
+    subject_id: str
+    class_id: str
+
+class NoDueStatus(Record):
+    __slots__ = ('student_id', 'subject_id', 'status', 'approved_by', 'approved_by_name', 'remarks', 'updated_at')
+
+    student_id: str
+    subject_id: str
+    status: str
+    approved_by: Optional[str]
+    approved_by_name: Optional[str]     # copied at decision time; absent on older records
+    remarks: Optional[str]
+    updated_at: Optional[datetime]
+
+class FinalApproval(Record):
+    __slots__ = ('student_id', 'status', 'approved_by', 'remarks', 'updated_at')
+
+    student_id: str
+    status: str
+    approved_by: Optional[str]
+    remarks: Optional[str]
+    updated_at: Optional[datetime]
+
+class Clearance(Record):
+    __slots__ = ('student_id', 'approved_count', 'total_count', 'all_approved',
+                 'final_status', 'final_remarks', 'final_updated_at')
+
+    student_id: str
+    approved_count: int
+    total_count: int
+    all_approved: bool
+    final_status: Optional[str]
+    final_remarks: Optional[str]
+    final_updated_at: Optional[datetime]
+
+class StudentProgress(Record):
+    __slots__ = ('name', 'roll_number', 'class_section', 'year', 'semester',
+                 'approved_subjects', 'total_subjects', 'final_status', 'final_remarks')
+
+    name: str
+    roll_number: Optional[str]
+    class_section: Optional[str]
+    year: Optional[int]
+    semester: Optional[int]
+    approved_subjects: int
+    total_subjects: int
+    final_status: str
+    final_remarks: Optional[str]
+
+class NoDueReportRow(Record):
+    __slots__ = ('name', 'roll_number', 'class_section', 'year', 'semester',
+                 'statuses', 'final_status', 'final_remarks')
+
+    name: str
+    roll_number: Optional[str]
+    class_section: Optional[str]
+    year: Optional[int]
+    semester: Optional[int]
+    statuses: List[Dict[str, Any]]
+    final_status: Optional[str]
+    final_remarks: Optional[str]
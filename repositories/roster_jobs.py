@@ -0,0 +1,28 @@
+from datetime import datetime
+from typing import Optional
+from pymongo import ReturnDocument
+from database import get_db
+
+# Progress of background roster imports, so any worker can answer a status
+# poll. Generated passwords stay on the document only until the finished
+# job is first fetched; documents expire a day after creation (see
+# indexes.py).
+
+def create(job_id: str, **fields) -> None:
+    now = datetime.utcnow()
+    get_db().roster_jobs.insert_one(dict(fields, _id=job_id, created_at=now, updated_at=now))
+
+def get(job_id: str) -> Optional[dict]:
+    return get_db().roster_jobs.find_one({'_id': job_id}, {'credentials': 0})
+
+def update(job_id: str, **fields) -> None:
+    get_db().roster_jobs.update_one({'_id': job_id}, {'$set': dict(fields, updated_at=datetime.utcnow())})
+
+def take_result(job_id: str) -> Optional[dict]:
+    # The finished job with its credentials, which are removed in the same
+    # step: a second fetch gets an empty list
+    return get_db().roster_jobs.find_one_and_update(
+        {'_id': job_id, 'status': 'done'},
+        {'$set': {'credentials': [], 'updated_at': datetime.utcnow()}},
+        return_document=ReturnDocument.BEFORE
+    )
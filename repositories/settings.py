@@ -0,0 +1,11 @@
+from datetime import datetime
+from typing import Optional
+from database import get_db
+
+# Deployment-wide settings, one document per key in the `settings` collection
+
+def get(key: str) -> Optional[dict]:
+    return get_db().settings.find_one({'_id': key})
+
+def put(key: str, **fields) -> None:
+    get_db().settings.update_one({'_id': key}, {'$set': dict(fields, updated_at=datetime.utcnow())}, upsert=True)
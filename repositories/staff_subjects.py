@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import Dict, Iterable, List
+from database import get_db
+from repositories.records import StaffSubject
+
+def find_for_staff(staff_ids: Iterable[str]) -> List[StaffSubject]:
+    return [
+        StaffSubject.from_doc(doc)
+        for doc in get_db().staff_subjects.find({'staff_id': {'$in': list(staff_ids)}}, StaffSubject.projection())
+    ]
+
+def counts_for_staff(staff_ids: Iterable[str]) -> Dict[str, int]:
+    return {row['_id']: row['count'] for row in get_db().staff_subjects.aggregate([
+        {'$match': {'staff_id': {'$in': list(staff_ids)}}},
+        {'$group': {'_id': '$staff_id', 'count': {'$sum': 1}}}
+    ])}
+
+def exists(staff_id: str, subject_id: str, class_id: str) -> bool:
+    return get_db().staff_subjects.find_one(
+        {'staff_id': staff_id, 'subject_id': subject_id, 'class_id': class_id},
+        {'_id': 1}
+    ) is not None
+
+def insert(staff_id: str, subject_id: str, class_id: str) -> str:
+    result = get_db().staff_subjects.insert_one({
+        'staff_id': staff_id,
+        'subject_id': subject_id,
+        'class_id': class_id,
+        'created_at': datetime.utcnow()
+    })
+    return str(result.inserted_id)
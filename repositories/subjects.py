@@ -0,0 +1,36 @@
+from datetime import datetime
+from typing import List, Optional
+from bson import ObjectId
+from database import get_db
+from repositories.records import Subject
+
+def get(subject_id: str) -> Optional[Subject]:
+    doc = get_db().subjects.find_one({'_id': ObjectId(subject_id)}, Subject.projection())
+    return Subject.from_doc(doc) if doc else None
+
+def find(department: str, semester: Optional[int] = None) -> List[Subject]:
+    query = {'department': department}
+    if semester is not None:
+        query['semester'] = semester
+    return [Subject.from_doc(doc) for doc in get_db().subjects.find(query, Subject.projection())]
+
+def find_ids(department: str, semester: int) -> List[str]:
+    return [str(doc['_id']) for doc in get_db().subjects.find({'department': department, 'semester': semester}, {'_id': 1})]
+
+def count(department: str, semester: int) -> int:
+    return get_db().subjects.count_documents({'department': department, 'semester': semester})
+
+def code_exists(department: str, code: str) -> bool:
+    return get_db().subjects.find_one({'code': code, 'department': department}, {'_id': 1}) is not None
+
+def insert(name: str, code: str, department: str, semester: int, credits: int, class_id: Optional[str]) -> str:
+    result = get_db().subjects.insert_one({
+        'name': name,
+        'code': code,
+        'department': department,
+        'semester': semester,
+        'credits': credits,
+        'class_id': class_id,
+        'created_at': datetime.utcnow()
+    })
+    return str(result.inserted_id)
@@ -0,0 +1,295 @@
+from typing import Dict, Iterable, Iterator, List, Optional, Set
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from database import get_db
+from repositories.records import User, Student, StudentProgress, NoDueReportRow
+from terms import term_conditions, term_match
+
+def get(user_id: str) -> Optional[User]:
+    doc = get_db().users.find_one({'_id': ObjectId(user_id)}, User.projection())
+    return User.from_doc(doc) if doc else None
+
+def get_student(student_id: str) -> Optional[Student]:
+    doc = get_db().users.find_one({'_id': ObjectId(student_id), 'role': 'student'}, Student.projection())
+    return Student.from_doc(doc) if doc else None
+
+def find_students_by_id(student_ids: Iterable[str]) -> List[Student]:
+    ids = [ObjectId(student_id) for student_id in student_ids]
+    if not ids:
+        return []
+    return [Student.from_doc(doc) for doc in get_db().users.find({'_id': {'$in': ids}, 'role': 'student'}, Student.projection())]
+
+def find_students(department: str, year: Optional[int] = None, semester: Optional[int] = None,
+                  class_section: Optional[str] = None, after: Optional[ObjectId] = None,
+                  limit: Optional[int] = None) -> Iterator[Student]:
+    # Students in _id order, optionally narrowed to a semester, section or class
+    query = {'role': 'student', 'department': department}
+    if year is not None:
+        query['year'] = year
+    if semester is not None:
+        query['semester'] = semester
+    if class_section is not None:
+        query['class_section'] = class_section
+    if after is not None:
+        query['_id'] = {'$gt': after}
+
+    cursor = get_db().users.find(query, Student.projection()).sort('_id', 1)
+    if limit:
+        cursor = cursor.limit(limit).batch_size(limit)
+    return (Student.from_doc(doc) for doc in cursor)
+
+def find_class_students(cls, after: Optional[ObjectId] = None, limit: Optional[int] = None) -> Iterator[Student]:
+    return find_students(cls.department, year=cls.year, semester=cls.semester,
+                         class_section=cls.section, after=after, limit=limit)
+
+def find_student_ids(department: str, semester: Optional[int] = None,
+                     class_section: Optional[str] = None) -> List[str]:
+    query = {'role': 'student', 'department': department}
+    if semester is not None:
+        query['semester'] = semester
+    if class_section is not None:
+        query['class_section'] = class_section
+    return [str(doc['_id']) for doc in get_db().users.find(query, {'_id': 1})]
+
+def find_credentials(email: str) -> Optional[dict]:
+    # The only read that returns the password field
+    return get_db().users.find_one({'email': email}, {'password': 1, 'role': 1, 'name': 1})
+
+def replace_password(user_id, old_password: str, new_password: str) -> bool:
+    # Skipped when the stored value changed since it was read
+    result = get_db().users.update_one({'_id': ObjectId(user_id), 'password': old_password},
+                                       {'$set': {'password': new_password}})
+    return result.modified_count == 1
+
+def existing_emails(emails: Iterable[str]) -> Set[str]:
+    return {doc['email'] for doc in get_db().users.find({'email': {'$in': list(emails)}}, {'email': 1})}
+
+def existing_roll_numbers(department: str, roll_numbers: Iterable[str]) -> Set[str]:
+    return {doc['roll_number'] for doc in get_db().users.find(
+        {'role': 'student', 'department': department, 'roll_number': {'$in': list(roll_numbers)}},
+        {'roll_number': 1}
+    )}
+
+def insert_students(docs: List[dict]) -> Dict[int, str]:
+    # Unordered, so one bad document does not stop the rest of the batch.
+    # Returns {position: error message} for documents that were not inserted.
+    if not docs:
+        return {}
+    try:
+        get_db().users.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        return {
+            error['index']: 'Email or roll number already registered' if error.get('code') == 11000
+            else error.get('errmsg', 'Write failed')
+            for error in e.details.get('writeErrors', [])
+        }
+    return {}
+
+def find_staff(department: str, roles: Iterable[str] = ('staff',)) -> List[User]:
+    return [
+        User.from_doc(doc)
+        for doc in get_db().users.find({'role': {'$in': list(roles)}, 'department': department}, User.projection())
+    ]
+
+def names(user_ids: Iterable[str]) -> Dict[str, str]:
+    ids = [ObjectId(user_id) for user_id in set(user_ids) if user_id and ObjectId.is_valid(user_id)]
+    if not ids:
+        return {}
+    return {str(doc['_id']): doc['name'] for doc in get_db().users.find({'_id': {'$in': ids}}, {'name': 1})}
+
+def department_progress(department: str, after: Optional[ObjectId] = None, limit: int = 100,
+                        class_section: Optional[str] = None, final_status: Optional[str] = None,
+                        has_pending: Optional[bool] = None) -> List[StudentProgress]:
+    # One aggregation joins subject totals, approved counts and final status so
+    # the number of queries does not grow with the number of students. Returns
+    # up to limit + 1 rows; the extra row tells the caller another page exists.
+    match = {'role': 'student', 'department': department}
+    if class_section:
+        match['class_section'] = class_section
+    if after is not None:
+        match['_id'] = {'$gt': after}
+
+    # Joins needed by a filter run before it, and the rest only for the page
+    # that survives $limit, so filtered pages do not join skipped students.
+    progress = [
+        {'$lookup': {
+            'from': 'subjects',
+            'let': {'department': '$department', 'semester': '$semester'},
+            'pipeline': [
+                {'$match': {'$expr': {'$and': [
+                    {'$eq': ['$department', '$$department']},
+                    {'$eq': ['$semester', '$$semester']}
+                ]}}},
+                {'$group': {'_id': None, 'count': {'$sum': 1}}}
+            ],
+            'as': 'subject_totals'
+        }},
+        {'$lookup': {
+            'from': 'no_due_status',
+            'let': {'sid': '$sid'},
+            'pipeline': [
+                {'$match': {'$expr': {'$and': [
+                    {'$eq': ['$student_id', '$$sid']},
+                    {'$eq': ['$status', 'approved']},
+                    *term_conditions()
+                ]}}},
+                {'$group': {'_id': None, 'count': {'$sum': 1}}}
+            ],
+            'as': 'approved_totals'
+        }},
+        {'$addFields': {
+            'total_subjects': {'$ifNull': [{'$first': '$subject_totals.count'}, 0]},
+            'approved_subjects': {'$ifNull': [{'$first': '$approved_totals.count'}, 0]}
+        }}
+    ]
+    final = [
+        {'$lookup': {
+            'from': 'final_approvals',
+            'localField': 'sid',
+            'foreignField': 'student_id',
+            'pipeline': [{'$match': term_match()}],
+            'as': 'final_approval'
+        }},
+        {'$addFields': {
+            'final_status': {'$ifNull': [{'$first': '$final_approval.status'}, 'not_requested']},
+            'final_remarks': {'$first': '$final_approval.remarks'}
+        }}
+    ]
+
+    pipeline = [{'$match': match}, {'$sort': {'_id': 1}}, {'$addFields': {'sid': {'$toString': '$_id'}}}]
+    if final_status:
+        pipeline += final + [{'$match': {'final_status': final_status}}]
+    if has_pending is not None:
+        pipeline += progress + [{'$match': {'$expr': {
+            '$lt' if has_pending else '$gte': ['$approved_subjects', '$total_subjects']
+        }}}]
+    pipeline.append({'$limit': limit + 1})
+    if has_pending is None:
+        pipeline += progress
+    if not final_status:
+        pipeline += final
+    pipeline.append({'$project': {
+        'name': 1,
+        'roll_number': 1,
+        'class_section': 1,
+        'year': 1,
+        'semester': 1,
+        'total_subjects': 1,
+        'approved_subjects': 1,
+        'final_status': 1,
+        'final_remarks': 1
+    }})
+
+    return [StudentProgress.from_doc(doc) for doc in get_db().users.aggregate(pipeline)]
+
+def final_approval_candidates(department: str, year: Optional[int] = None, semester: Optional[int] = None,
+                              class_section: Optional[str] = None,
+                              student_ids: Optional[Iterable[str]] = None) -> List[StudentProgress]:
+    # Clearance progress for bulk final approval in one aggregation. Unlike
+    # department_progress, only approvals of the student's own semester
+    # subjects count, matching the student_clearance summaries.
+    match = {'role': 'student', 'department': department}
+    if year is not None:
+        match['year'] = year
+    if semester is not None:
+        match['semester'] = semester
+    if class_section is not None:
+        match['class_section'] = class_section
+    if student_ids is not None:
+        match['_id'] = {'$in': [ObjectId(student_id) for student_id in student_ids if ObjectId.is_valid(student_id)]}
+
+    pipeline = [
+        {'$match': match},
+        {'$sort': {'class_section': 1, 'roll_number': 1, '_id': 1}},
+        {'$addFields': {'sid': {'$toString': '$_id'}}},
+        {'$lookup': {
+            'from': 'subjects',
+            'let': {'department': '$department', 'semester': '$semester'},
+            'pipeline': [
+                {'$match': {'$expr': {'$and': [
+                    {'$eq': ['$department', '$$department']},
+                    {'$eq': ['$semester', '$$semester']}
+                ]}}},
+                {'$project': {'_id': 0, 'id': {'$toString': '$_id'}}}
+            ],
+            'as': 'semester_subjects'
+        }},
+        {'$addFields': {'subject_ids': '$semester_subjects.id'}},
+        {'$lookup': {
+            'from': 'no_due_status',
+            'let': {'sid': '$sid', 'subject_ids': '$subject_ids'},
+            'pipeline': [
+                {'$match': {'$expr': {'$and': [
+                    {'$eq': ['$student_id', '$$sid']},
+                    {'$eq': ['$status', 'approved']},
+                    {'$in': ['$subject_id', '$$subject_ids']},
+                    *term_conditions()
+                ]}}},
+                {'$group': {'_id': None, 'count': {'$sum': 1}}}
+            ],
+            'as': 'approved_totals'
+        }},
+        {'$lookup': {
+            'from': 'final_approvals',
+            'localField': 'sid',
+            'foreignField': 'student_id',
+            'pipeline': [{'$match': term_match()}],
+            'as': 'final_approval'
+        }},
+        {'$project': {
+            'name': 1,
+            'roll_number': 1,
+            'class_section': 1,
+            'year': 1,
+            'semester': 1,
+            'total_subjects': {'$size': '$subject_ids'},
+            'approved_subjects': {'$ifNull': [{'$first': '$approved_totals.count'}, 0]},
+            'final_status': {'$ifNull': [{'$first': '$final_approval.status'}, 'not_requested']},
+            'final_remarks': {'$first': '$final_approval.remarks'}
+        }}
+    ]
+
+    return [StudentProgress.from_doc(doc) for doc in get_db().users.aggregate(pipeline)]
+
+def no_due_report(department: str, class_section: Optional[str] = None,
+                  batch_size: int = 500) -> Iterator[NoDueReportRow]:
+    # Every student with their no-due statuses and final approval, read from a
+    # single cursor in batches so exports never hold the department in memory.
+    match = {'role': 'student', 'department': department}
+    if class_section:
+        match['class_section'] = class_section
+
+    pipeline = [
+        {'$match': match},
+        {'$sort': {'class_section': 1, 'roll_number': 1, '_id': 1}},
+        {'$addFields': {'sid': {'$toString': '$_id'}}},
+        {'$lookup': {
+            'from': 'no_due_status',
+            'let': {'sid': '$sid'},
+            'pipeline': [
+                {'$match': {'$expr': {'$and': [{'$eq': ['$student_id', '$$sid']}, *term_conditions()]}}},
+                {'$project': {'_id': 0, 'subject_id': 1, 'status': 1, 'remarks': 1}}
+            ],
+            'as': 'statuses'
+        }},
+        {'$lookup': {
+            'from': 'final_approvals',
+            'localField': 'sid',
+            'foreignField': 'student_id',
+            'pipeline': [{'$match': term_match()}],
+            'as': 'final_approval'
+        }},
+        {'$project': {
+            'name': 1,
+            'roll_number': 1,
+            'class_section': 1,
+            'year': 1,
+            'semester': 1,
+            'statuses': 1,
+            'final_status': {'$ifNull': [{'$first': '$final_approval.status'}, 'not_requested']},
+            'final_remarks': {'$first': '$final_approval.remarks'}
+        }}
+    ]
+
+    for doc in get_db().users.aggregate(pipeline, batchSize=batch_size, allowDiskUse=True):
+        yield NoDueReportRow.from_doc(doc)
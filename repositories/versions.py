@@ -0,0 +1,11 @@
+from typing import Dict, Iterable
+from pymongo import UpdateOne
+from database import get_db
+
+def find(scopes: Iterable[str]) -> Dict[str, int]:
+    return {doc['_id']: doc['version'] for doc in get_db().versions.find({'_id': {'$in': list(scopes)}})}
+
+def increment(scopes: Iterable[str]) -> None:
+    updates = [UpdateOne({'_id': scope}, {'$inc': {'version': 1}}, upsert=True) for scope in set(scopes)]
+    if updates:
+        get_db().versions.bulk_write(updates, ordered=False)
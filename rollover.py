@@ -0,0 +1,82 @@
+import click
+from datetime import datetime
+from flask import current_app
+from flask.cli import with_appcontext
+from clearance import rebuild_clearances
+from database import get_db
+from indexes import replaced_indexes
+from repositories import archive, settings
+from terms import ACTIVE_TERM, forget_active_term
+
+# Semester rollover:
+#   flask term start 2026-27-odd   make a new term active
+#   flask term archive             move closed terms to the archive collections
+#   flask term show                active term and live documents per term
+#
+# Starting the first term stamps existing documents with it. Starting a
+# later one leaves the previous term's documents in place, stamping any
+# unscoped stragglers with the previous term, so they become archivable.
+# Other workers keep serving the old term until their cached value expires,
+# and archive refuses to run before that.
+
+@click.group('term')
+def term_command():
+    """Academic terms and archival of closed ones."""
+
+@term_command.command('start')
+@click.argument('term')
+@with_appcontext
+def start_command(term):
+    current = settings.get(ACTIVE_TERM) or {}
+    previous = current.get('term')
+    if previous == term:
+        raise click.ClickException(f'{term} is already the active term')
+    # The pre-term unique keys would reject the new term's statuses
+    left = replaced_indexes(get_db())
+    if previous and left:
+        raise click.ClickException(f"{', '.join(f'{c}.{n}' for c, n in left)} still exist; "
+                                   'run `flask indexes --drop-replaced` first')
+
+    for collection in archive.TERM_COLLECTIONS:
+        stamped = archive.stamp_missing(collection, previous or term)
+        if stamped:
+            click.echo(f'Stamped {stamped} {collection} documents with {previous or term}')
+
+    settings.put(ACTIVE_TERM, term=term, previous=previous, started_at=datetime.utcnow())
+    forget_active_term()
+    # Summaries now reflect the new term, which starts with no approvals
+    rebuilt = rebuild_clearances()
+    click.echo(f'Active term is {term}; rebuilt clearance summaries for {rebuilt} students')
+
+@term_command.command('archive')
+@click.option('--batch-size', default=1000, show_default=True, help='Documents moved per batch.')
+@with_appcontext
+def archive_command(batch_size):
+    current = settings.get(ACTIVE_TERM)
+    if not current:
+        raise click.ClickException('No active term; run `flask term start` first')
+
+    settle = current_app.config.get('TERM_CACHE_TTL', 30)
+    elapsed = (datetime.utcnow() - current['started_at']).total_seconds()
+    if elapsed < settle:
+        raise click.ClickException(f'Term started {elapsed:.0f}s ago; wait {settle - elapsed:.0f}s '
+                                   'until every worker has switched to it')
+
+    for collection in archive.TERM_COLLECTIONS:
+        moved = 0
+        while True:
+            count = archive.archive_batch(collection, current['term'], batch_size)
+            if not count:
+                break
+            moved += count
+            click.echo(f'{collection}: {moved} archived')
+        click.echo(f'{collection}: done, {moved} documents moved to {collection}_archive')
+
+@term_command.command('show')
+@with_appcontext
+def show_command():
+    current = settings.get(ACTIVE_TERM)
+    click.echo(f"Active term: {current['term'] if current else 'none'}")
+    for collection in archive.TERM_COLLECTIONS:
+        for row in archive.term_counts(collection):
+            click.echo(f"{collection}  {row['term'] or '(no term)'}  {row['count']}")
@@ -0,0 +1,227 @@
+import csv
+import re
+import secrets
+import threading
+import uuid
+from datetime import datetime
+from flask import current_app
+from current_user import invalidate_user
+from etags import bump, progress_scope
+from passwords import HasherBusy, hash_passwords
+from reference_data import invalidate_department
+from repositories import roster_jobs, users
+
+# Bulk student import. The whole CSV is read and checked row by row first
+# (problems are reported per row instead of failing the upload); valid rows
+# are then written in batches of BATCH_SIZE, each checked against existing
+# accounts with one query and inserted with one unordered insert_many.
+#
+# Passwords are hashed with the full work factor on the shared pool, so
+# hashing dominates: roughly rows x hash time / PASSWORD_HASH_WORKERS, about
+# 4-5 minutes for 5,000 rows with scrypt on two threads. That is far beyond
+# a request timeout, so with BACKGROUND_JOBS the write runs on a background
+# thread and reports its progress in `roster_jobs`, which any worker can
+# answer polls from. Where background threads do not survive the response
+# (serverless), the import runs in the request and uploads of more than
+# ROSTER_INLINE_ROWS rows are refused.
+#
+# A batch that cannot be hashed (passwords.HasherBusy) is not inserted, and
+# neither are the ones after it: those rows come back as errors to upload
+# again, while the batches already written keep their generated passwords
+# in the result.
+#
+# Columns (case-insensitive, spaces allowed): name, email, roll_number, year,
+# semester, class_section (or section) and optionally password. Rows without
+# a password get a random one, returned once to the importer so it can be
+# handed out; nothing guessable is ever used. Passwords are stored hashed.
+# The export's Roll Number and Section headers are accepted as they are.
+
+BATCH_SIZE = 100
+REQUIRED_COLUMNS = ('name', 'email', 'roll_number', 'year', 'semester', 'class_section')
+_ALIASES = {'section': 'class_section', 'roll_no': 'roll_number'}
+_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+class RosterError(ValueError):
+    pass
+
+def _column(name):
+    name = re.sub(r'[\s-]+', '_', (name or '').strip().lower())
+    return _ALIASES.get(name, name)
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _student(row, department, sections, now):
+    # Returns (document, None) or (None, error message)
+    values = {key: (value or '').strip() for key, value in row.items() if key}
+    missing = [column for column in REQUIRED_COLUMNS if not values.get(column)]
+    if missing:
+        return None, f"Missing {', '.join(missing)}"
+    if not _EMAIL.match(values['email']):
+        return None, 'Invalid email'
+
+    year, semester = _int(values['year']), _int(values['semester'])
+    if year is None or semester is None:
+        return None, 'Year and semester must be numbers'
+    if semester not in (year * 2 - 1, year * 2):
+        return None, f'Semester {semester} is not in year {year}'
+    if (year, semester, values['class_section']) not in sections:
+        return None, f"No class for year {year}, semester {semester}, section {values['class_section']}"
+
+    return {
+        'name': values['name'],
+        'email': values['email'],
+        'password': values.get('password') or None,
+        'role': 'student',
+        'department': department,
+        'class_section': values['class_section'],
+        'year': year,
+        'semester': semester,
+        'roll_number': values['roll_number'],
+        'created_at': now
+    }, None
+
+def _error(row_number, doc_or_row, message):
+    return {
+        'row': row_number,
+        'roll_number': doc_or_row.get('roll_number'),
+        'email': doc_or_row.get('email'),
+        'message': message
+    }
+
+def _write_batch(department, batch, errors, credentials):
+    # batch: [(row number, document)]; returns the number inserted and adds
+    # the generated passwords of inserted rows to `credentials`
+    emails = users.existing_emails([doc['email'] for _, doc in batch])
+    roll_numbers = users.existing_roll_numbers(department, [doc['roll_number'] for _, doc in batch])
+
+    pending = []
+    for row_number, doc in batch:
+        if doc['email'] in emails:
+            errors.append(_error(row_number, doc, 'Email already registered'))
+        elif doc['roll_number'] in roll_numbers:
+            errors.append(_error(row_number, doc, 'Roll number already registered'))
+        else:
+            pending.append((row_number, doc))
+
+    generated = {}
+    for index, (_, doc) in enumerate(pending):
+        if doc['password'] is None:
+            doc['password'] = generated[index] = secrets.token_urlsafe(9)
+    hashes = hash_passwords([doc['password'] for _, doc in pending])
+    for (_, doc), password_hash in zip(pending, hashes):
+        doc['password'] = password_hash
+
+    failed = users.insert_students([doc for _, doc in pending])
+    for index, message in failed.items():
+        row_number, doc = pending[index]
+        errors.append(_error(row_number, doc, message))
+    for index, (_, doc) in enumerate(pending):
+        if index not in failed:
+            invalidate_user(doc['_id'])
+    for index, password in generated.items():
+        if index not in failed:
+            row_number, doc = pending[index]
+            credentials.append({'row': row_number, 'email': doc['email'],
+                                'roll_number': doc['roll_number'], 'password': password})
+    return len(pending) - len(failed)
+
+def read_roster(department, classes, lines):
+    # `lines` is a text stream or any iterable of CSV lines. Returns
+    # ([(row number, document)], [row errors]); raises RosterError for an
+    # unusable header.
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None:
+        raise RosterError('The file is empty')
+    reader.fieldnames = [_column(name) for name in reader.fieldnames]
+    missing = [column for column in REQUIRED_COLUMNS if column not in reader.fieldnames]
+    if missing:
+        raise RosterError(f"Missing columns: {', '.join(missing)}")
+
+    sections = {(cls.year, cls.semester, cls.section) for cls in classes}
+    now = datetime.utcnow()
+    seen_emails = set()
+    seen_roll_numbers = set()
+    rows = []
+    errors = []
+    for row in reader:
+        row_number = reader.line_num
+        doc, message = _student(row, department, sections, now)
+        if doc is None:
+            errors.append(_error(row_number, row, message))
+            continue
+        # Duplicates inside the file are caught here, the database catches the rest
+        if doc['email'] in seen_emails:
+            errors.append(_error(row_number, doc, 'Email appears earlier in the file'))
+            continue
+        if doc['roll_number'] in seen_roll_numbers:
+            errors.append(_error(row_number, doc, 'Roll number appears earlier in the file'))
+            continue
+        seen_emails.add(doc['email'])
+        seen_roll_numbers.add(doc['roll_number'])
+        rows.append((row_number, doc))
+    return rows, errors
+
+def write_roster(department, rows, errors, credentials, progress=None):
+    # Inserts the rows read by read_roster and returns how many were
+    # imported. Row errors are added to `errors` and the generated passwords
+    # of inserted rows to `credentials` as each batch is written, so a
+    # caller that sees an exception still has those of the committed rows.
+    # progress(rows done, imported) is called after every batch.
+    imported = 0
+    for start in range(0, len(rows), BATCH_SIZE):
+        batch = rows[start:start + BATCH_SIZE]
+        try:
+            imported += _write_batch(department, batch, errors, credentials)
+        except HasherBusy:
+            errors.extend(_error(row_number, doc, 'Not imported, the server was busy; upload this row again')
+                          for row_number, doc in rows[start:])
+            break
+        if progress is not None:
+            progress(start + len(batch), imported)
+    errors.sort(key=lambda error: error['row'])
+    credentials.sort(key=lambda entry: entry['row'])
+    return imported
+
+def refresh_department(department):
+    # Listings and progress views of the department include new students
+    invalidate_department(department)
+    bump(progress_scope(department))
+
+def start_import(department, rows, errors):
+    # Returns the job id; the rows are written on a background thread
+    job_id = uuid.uuid4().hex
+    roster_jobs.create(job_id, department=department, status='running', total=len(rows), done=0, imported=0)
+    threading.Thread(
+        target=_run_import,
+        args=(current_app._get_current_object(), job_id, department, rows, errors),
+        name='roster-import',
+        daemon=True
+    ).start()
+    return job_id
+
+def _run_import(app, job_id, department, rows, errors):
+    with app.app_context():
+        credentials = []
+        progress = {'imported': 0}
+
+        def report(done, imported):
+            progress['imported'] = imported
+            roster_jobs.update(job_id, done=done, imported=imported)
+
+        try:
+            imported = write_roster(department, rows, errors, credentials, report)
+            roster_jobs.update(job_id, status='done', done=len(rows), imported=imported,
+                               errors=errors, credentials=credentials)
+        except Exception as e:
+            # Rows of earlier batches are in; keep their passwords retrievable
+            app.logger.exception('Roster import %s failed', job_id)
+            roster_jobs.update(job_id, status='done', imported=progress['imported'],
+                               errors=errors + [{'row': None, 'roll_number': None, 'email': None,
+                                                 'message': f'Import stopped: {e}'}],
+                               credentials=credentials)
+        if progress['imported']:
+            refresh_department(department)
@@ -0,0 +1,34 @@
+import os
+import time
+from flask import g
+
+# Cold-start measurement. `import_ms` is the time from the start of app.py to
+# the app being ready; the first request served by each process also reports
+# its own duration, which includes opening the Mongo connection. Both are
+# logged and sent once as a Server-Timing header, and kept in
+# app.extensions['startup'].
+
+def init_startup_timing(app, started_at):
+    import_ms = (time.perf_counter() - started_at) * 1000
+    app.extensions['startup'] = {'pid': os.getpid(), 'import_ms': round(import_ms, 1), 'first_request_ms': None}
+    app.logger.info('App ready in %.1f ms', import_ms)
+
+    @app.before_request
+    def start_first_request_timer():
+        startup = app.extensions['startup']
+        if startup['pid'] != os.getpid():
+            # Forked worker of a preloaded app; the parent paid for the import
+            startup.update(pid=os.getpid(), import_ms=0.0, first_request_ms=None)
+        if startup['first_request_ms'] is None and 'startup_timer' not in g:
+            g.startup_timer = time.perf_counter()
+
+    @app.after_request
+    def report_first_request(response):
+        startup = app.extensions['startup']
+        if 'startup_timer' in g and startup['first_request_ms'] is None:
+            startup['first_request_ms'] = round((time.perf_counter() - g.startup_timer) * 1000, 1)
+            app.logger.info('First request of pid %s served in %.1f ms', startup['pid'], startup['first_request_ms'])
+            timing = f"cold-start;dur={startup['import_ms']}, first-request;dur={startup['first_request_ms']}"
+            existing = response.headers.get('Server-Timing')
+            response.headers['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+        return response
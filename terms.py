@@ -0,0 +1,60 @@
+from flask import current_app, g
+from cache import TTLCache
+from repositories import settings
+
+# Academic terms. no_due_status and final_approvals documents carry the term
+# they were written in, and every read and write of those collections is
+# scoped to the active term, so closed terms can be moved to archive
+# collections without touching the hot path (see rollover.py).
+#
+# The active term lives in the `settings` collection and is cached per
+# process for TERM_CACHE_TTL seconds. Until a first term is started nothing
+# is scoped, so a deployment without terms behaves as before.
+
+ACTIVE_TERM = 'active_term'
+
+def _term_cache():
+    cache = current_app.extensions.get('term_cache')
+    if cache is None:
+        cache = current_app.extensions['term_cache'] = TTLCache(
+            maxsize=1,
+            ttl=current_app.config.get('TERM_CACHE_TTL', 30)
+        )
+    return cache
+
+def active_term():
+    cache = _term_cache()
+    entry = cache.get(ACTIVE_TERM)
+    if entry is None:
+        doc = settings.get(ACTIVE_TERM)
+        entry = (doc or {}).get('term'),
+        cache.set(ACTIVE_TERM, entry)
+    return entry[0]
+
+def forget_active_term():
+    _term_cache().pop(ACTIVE_TERM)
+    g.pop('term', None)
+
+def current_term():
+    # One term per request, even if the cached value expires halfway through
+    if 'term' not in g:
+        g.term = active_term()
+    return g.term
+
+def with_term(query, term):
+    # `query` narrowed to `term`; None leaves it unscoped
+    query = dict(query or {})
+    if term is not None:
+        query['term'] = term
+    return query
+
+def term_match(query=None):
+    # A no_due_status or final_approvals filter narrowed to the active term.
+    # Coroutines on the Mongo loop cannot read `g` (nor query settings
+    # there); they take current_term() from their caller and use with_term.
+    return with_term(query, current_term())
+
+def term_conditions():
+    # The same restriction for $expr matches inside $lookup pipelines
+    term = current_term()
+    return [{'$eq': ['$term', term]}] if term is not None else []
@@ -0,0 +1,49 @@
+import os
+import shutil
+import pytest
+
+# Tests that count MongoDB commands need a real server: command events do
+# not fire on mocks. MONGODB_TEST_URI points them at a scratch database (it
+# is dropped); otherwise a throwaway mongod is started when one is on PATH,
+# and the tests are skipped when neither is available.
+#
+#   python -m pytest                                   # mongod on PATH
+#   MONGODB_TEST_URI=mongodb://localhost:27017/nodue_test python -m pytest
+
+@pytest.fixture(scope='session')
+def mongodb_uri():
+    uri = os.environ.get('MONGODB_TEST_URI')
+    if uri:
+        yield uri
+        return
+    if shutil.which('mongod') is None:
+        pytest.skip('mongod is not on PATH and MONGODB_TEST_URI is not set')
+    from benchmarks.__main__ import spawn_mongod
+    try:
+        with spawn_mongod() as uri:
+            yield uri
+    except SystemExit as e:
+        pytest.fail(str(e))
+
+@pytest.fixture(scope='session')
+def app(mongodb_uri):
+    from pymongo import MongoClient
+    client = MongoClient(mongodb_uri)
+    client.drop_database(client.get_database().name)
+    client.close()
+
+    # The app reads its config at import time
+    os.environ['MONGODB_URI'] = mongodb_uri
+    os.environ.setdefault('MONGO_TLS', '0')
+    os.environ['EVENTS_CHANGE_STREAMS'] = '0'
+    from app import app
+    from benchmarks.runner import CommandCounter
+
+    counter = CommandCounter()
+    app.config['MONGO_EVENT_LISTENERS'] = list(app.config.get('MONGO_EVENT_LISTENERS') or []) + [counter]
+    app.extensions['test_counter'] = counter
+    return app
+
+@pytest.fixture(scope='session')
+def counter(app):
+    return app.extensions['test_counter']
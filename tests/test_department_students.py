@@ -0,0 +1,32 @@
+# Query-count regression test for /hod/api/department-students: the
+# response is built from one aggregation, so a department of 10 students
+# and one of 400 cost the same number of MongoDB commands. The app and
+# counter fixtures (conftest.py) need a MongoDB server.
+
+def _department_students_commands(app, counter, department, students):
+    from benchmarks.dataset import Scale, generate_department
+    from benchmarks.runner import CACHES
+
+    with app.app_context():
+        ids = generate_department(app.extensions['mongo'].get_database(),
+                                  Scale(classes=1, subjects=4, students=students, staff=2), department)
+    for name in CACHES:
+        if name in app.extensions:
+            app.extensions[name].clear()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = ids['hod']
+        session['user_role'] = 'hod'
+
+    before = counter.count
+    response = client.get('/hod/api/department-students')
+    assert response.status_code == 200
+    assert len(response.get_json()) == min(students, 100)
+    return counter.count - before
+
+def test_department_students_query_count_is_constant(app, counter):
+    small = _department_students_commands(app, counter, 'SMALL', 10)
+    large = _department_students_commands(app, counter, 'LARGE', 400)
+    assert small == large
+    assert large <= 6
@@ -0,0 +1,21 @@
+import io
+
+# Every endpoint in benchmarks.endpoints must answer successfully within its
+# MongoDB command budget, cold and warm: the same check as
+# `python -m benchmarks`, on a smaller department, so a budget violation
+# fails the test run.
+
+def test_endpoints_stay_within_query_budgets(app, counter):
+    from benchmarks.dataset import Scale, generate_department
+    from benchmarks.endpoints import ENDPOINTS
+    from benchmarks.runner import report, run
+    from clearance import rebuild_clearances
+
+    with app.app_context():
+        ids = generate_department(app.extensions['mongo'].get_database(),
+                                  Scale(classes=4, subjects=4, students=30, staff=4), 'BUDGET')
+        rebuild_clearances(ids['department'])
+
+    results = run(app, counter, ENDPOINTS, ids, repeat=2)
+    out = io.StringIO()
+    assert report(results, out), out.getvalue()
@@ -0,0 +1,90 @@
+import time
+import roster
+from passwords import HasherBusy
+
+# Roster imports that stop part way must still hand out the passwords of the
+# rows they committed. Uses the MongoDB fixtures in conftest.py.
+
+def _department(app, department):
+    from datetime import datetime
+    with app.app_context():
+        db = app.extensions['mongo'].get_database()
+        hod_id = db.users.insert_one({
+            'name': 'Roster HOD', 'email': f'hod@{department.lower()}.test', 'password': 'x', 'role': 'hod',
+            'department': department, 'class_section': None, 'year': None, 'semester': None,
+            'roll_number': None, 'created_at': datetime.utcnow()
+        }).inserted_id
+        db.classes.insert_one({'name': f'{department} 1A', 'department': department, 'year': 1, 'semester': 1,
+                               'section': 'A', 'class_advisor_id': None, 'created_at': datetime.utcnow()})
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['user_id'] = str(hod_id)
+        session['user_role'] = 'hod'
+    return client
+
+def _csv(department, rows):
+    lines = ['name,email,roll_number,year,semester,class_section']
+    lines += [f'Student {n},s{n}@{department.lower()}.test,{department}{n:04d},1,1,A' for n in range(rows)]
+    return '\n'.join(lines) + '\n'
+
+def _fail_after(monkeypatch, batches):
+    calls = []
+    hash_passwords = roster.hash_passwords
+
+    def flaky(passwords):
+        calls.append(len(passwords))
+        if len(calls) > batches:
+            raise HasherBusy()
+        # The work factor is not under test
+        return [f'pbkdf2:sha256:600000$test${password}' for password in passwords]
+    monkeypatch.setattr(roster, 'hash_passwords', flaky)
+    return hash_passwords
+
+def _count(app, department):
+    with app.app_context():
+        return app.extensions['mongo'].get_database().users.count_documents({'role': 'student', 'department': department})
+
+def test_busy_hasher_keeps_credentials_of_committed_rows(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'BACKGROUND_JOBS', False)
+    monkeypatch.setitem(app.config, 'ROSTER_INLINE_ROWS', 1000)
+    _fail_after(monkeypatch, 1)
+    client = _department(app, 'PARTIAL')
+
+    rows = roster.BATCH_SIZE + 30
+    response = client.post('/hod/api/import/students', data=_csv('PARTIAL', rows), content_type='text/csv')
+    assert response.status_code == 200
+    result = response.get_json()
+    assert result['imported'] == roster.BATCH_SIZE == _count(app, 'PARTIAL')
+    assert len(result['credentials']) == roster.BATCH_SIZE
+    assert len(result['errors']) == 30
+    assert all('upload this row again' in error['message'] for error in result['errors'])
+
+def test_background_import_reports_progress_and_credentials_once(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'BACKGROUND_JOBS', True)
+    _fail_after(monkeypatch, 100)
+    client = _department(app, 'JOB')
+
+    response = client.post('/hod/api/import/students', data=_csv('JOB', 250), content_type='text/csv')
+    assert response.status_code == 202
+    job = response.get_json()
+    job_id = job['job_id']
+    assert job['total'] == 250
+    deadline = time.monotonic() + 30
+    while job['status'] == 'running' and time.monotonic() < deadline:
+        time.sleep(0.1)
+        job = client.get(f'/hod/api/import/students/{job_id}').get_json()
+
+    assert job['status'] == 'done'
+    assert job['imported'] == 250 == _count(app, 'JOB')
+    assert len(job['credentials']) == 250
+    again = client.get(f'/hod/api/import/students/{job_id}').get_json()
+    assert again['imported'] == 250 and again['credentials'] == []
+
+def test_inline_import_refuses_large_rosters(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'BACKGROUND_JOBS', False)
+    monkeypatch.setitem(app.config, 'ROSTER_INLINE_ROWS', 10)
+    client = _department(app, 'INLINE')
+
+    response = client.post('/hod/api/import/students', data=_csv('INLINE', 11), content_type='text/csv')
+    assert response.status_code == 413
+    assert _count(app, 'INLINE') == 0